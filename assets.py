@@ -0,0 +1,71 @@
+import pygame
+from pygame.mask import from_surface
+
+from cache import LruCache
+from constants import ROTATION_STEP, ROTATION_CACHE_SIZE, SCALED_IMAGES_CACHE_SIZE
+
+
+class RotationCache:
+    # rotating an image and calculating mask of the rotated image are the most expensive things mob does.
+    # mobs of the same kind and size look exactly the same, so their rotated images and masks can be shared.
+    # angles are rounded to ROTATION_STEP degrees, so there is a limited number of different images for each mob.
+    # images are calculated when they are needed for the first time
+    # and least recently used images are removed when cache takes too much memory
+    def __init__(self, max_size):
+        self.items = LruCache(max_size)  # key -> (image, mask), size is in bytes
+
+    @staticmethod
+    def get_bucket(angle):
+        return round(angle / ROTATION_STEP) % (360 // ROTATION_STEP)
+
+    def get(self, kind, image, frame, angle):
+        # kind is name of class of mob, frame is number of animation frame.
+        # image is not rotated image of mob (its sight direction is 90 degrees)
+        key = kind, image.get_size(), frame, self.get_bucket(angle)
+        item = self.items.get(key)
+        if item is None:
+            item = self.add(key, image)
+        return item
+
+    def add(self, key, image):
+        angle = key[-1] * ROTATION_STEP
+        rotated = pygame.transform.rotate(image, angle - 90)
+        mask = from_surface(rotated)
+        w, h = rotated.get_size()
+        size = w * h * rotated.get_bytesize() + w * h // 8  # image pixels and mask bits
+        return self.items.put(key, (rotated, mask), size)
+
+    def warm_up(self, kind, image, frame):
+        # calculate images for all angles in advance, so there are no calculations during the game
+        for bucket in range(360 // ROTATION_STEP):
+            self.get(kind, image, frame, bucket * ROTATION_STEP)
+
+
+class ScaledImageCache:
+    # objects of the same kind and size look exactly the same,
+    # so all of them share one scaled image and mask instead of scaling image of kind for every object.
+    # least recently used sizes are removed when cache takes too much memory
+    # (objects that already use removed image keep it, only new objects get a new one)
+    def __init__(self, max_size):
+        self.items = LruCache(max_size)  # (kind, size) -> (image, mask), size is in bytes
+
+    def get(self, kind, image, mask, size):
+        # kind is name of class of object, image and mask are not scaled ones of this kind.
+        # mask can be None if it isn't needed
+        key = kind, size
+        item = self.items.get(key)
+        if item is None:
+            item = self.add(key, image, mask)
+        return item
+
+    def add(self, key, image, mask):
+        size = key[1]
+        scaled = pygame.transform.scale(image, size)
+        scaled_mask = None if mask is None else mask.scale(size)
+        w, h = size
+        bytes_size = w * h * scaled.get_bytesize() + (0 if mask is None else w * h // 8)
+        return self.items.put(key, (scaled, scaled_mask), bytes_size)
+
+
+ROTATIONS = RotationCache(ROTATION_CACHE_SIZE)
+SCALED_IMAGES = ScaledImageCache(SCALED_IMAGES_CACHE_SIZE)
@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from constants import AUTOSAVE_PERIOD, COMPACTION_PERIOD
+from snapshot import get_records, write_snapshot, write_delta, NEW_ID
+
+
+class Autosave:
+    # saves world periodically without stopping the game.
+    # params of mobs are copied on game thread (it's cheap),
+    # packing and writing files is done on worker thread.
+    # most of the time only delta (mobs that changed since the last full snapshot) is written,
+    # full snapshot is written once in COMPACTION_PERIOD, so deltas don't grow too big.
+    # static objects never change, so they are never written to delta
+    def __init__(self, world):
+        self.world = world
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future = None  # last save job
+        self.time = 0  # ms
+        self.last_full_save = None
+        self.last_delta_save = 0
+        self.checksum = None  # checksum of the last full snapshot
+        self.base = []  # records of the last full snapshot
+        self.mob_ids = {}  # mob -> its id in the last full snapshot
+        self.chunks = None  # chunks in memory of full snapshot that is being written
+
+    def tick(self, ticks):
+        self.time += ticks
+        if self.future is not None:
+            if not self.future.done():
+                return  # previous save isn't finished yet, we shouldn't wait for it
+            checksum = self.future.result()
+            if checksum is not None:
+                self.checksum = checksum
+                self.world.chunks.on_snapshot_saved(self.chunks)
+                self.chunks = None
+            self.future = None
+        if self.last_full_save is None or self.time - self.last_full_save >= COMPACTION_PERIOD * 1000:
+            self.save_snapshot()
+        elif self.time - self.last_delta_save >= AUTOSAVE_PERIOD * 1000:
+            self.save_delta()
+
+    def save_snapshot(self):
+        objects = list(self.world.objects)
+        self.base = get_records(objects)
+        self.mob_ids = {obj: i for i, obj in enumerate(objects) if obj in self.world.mobs}
+        self.last_full_save = self.last_delta_save = self.time
+        self.chunks = sorted(self.world.chunks.resident)
+        self.future = self.executor.submit(write_snapshot, self.base, self.world.save_path, self.world.chunks.seed,
+                                           self.chunks)
+
+    def save_delta(self):
+        removed, changed = [], []
+        for mob, mob_id in self.mob_ids.items():
+            if not mob.alive():
+                removed.append(mob_id)
+            else:
+                params = mob.get_params()
+                if params != self.base[mob_id][1]:
+                    changed.append((mob.__class__, params, mob_id))
+        for mob in self.world.mobs:
+            if mob not in self.mob_ids:
+                changed.append((mob.__class__, mob.get_params(), NEW_ID))
+        self.last_delta_save = self.time
+        self.future = self.executor.submit(write_delta, self.checksum, removed, changed, self.world.save_path)
+
+    def request_snapshot(self):
+        # full snapshot is written as soon as the previous save is finished
+        self.last_full_save = None
+
+    def close(self):
+        # waits until the last save is finished, after that world can be saved or deleted on game thread
+        self.executor.shutdown(wait=True)
+        if self.future is not None:
+            self.future.result()
+            self.future = None
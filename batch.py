@@ -0,0 +1,112 @@
+import os
+from math import isnan
+from random import Random
+import numpy as np
+
+from constants import SIMULATION_RATE, OBSERVED_MONSTERS
+from content import World
+
+# many independent worlds are simulated in one process without window and rendering
+# (e.g. for bots and load testing). all worlds make one simulation step at a time (lockstep).
+# every world is deterministic and has its own rng and save path, while images, masks and other caches
+# are shared by all of them, so a hundred worlds cost much less than a hundred processes.
+#
+# action of every world is a row of 4 numbers:
+# 1) horizontal movement of character: -1 (left), 0 or 1 (right)
+# 2) vertical movement of character: -1 (down), 0 or 1 (up)
+# 3) direction character looks in (degrees) or nan if character shouldn't turn
+# 4) attack: 1 or 0
+# observations are arrays (one row per world, nan if there is no value):
+# character - x, y of center, hp, direction character looks in, direction character moves in
+# monsters - the nearest monsters on screen (OBSERVED_MONSTERS of them):
+#            x, y of center relative to character, hp, direction monster moves in
+# alive - character is alive (world of dead character isn't simulated until it's reset)
+ACTION_SIZE = 4
+CHARACTER_FEATURES = 5
+MONSTER_FEATURES = 4
+
+
+def get_direction(direction):
+    return np.nan if direction is None else direction
+
+
+class WorldBatch:
+    def __init__(self, number_of_worlds, seed=None, save_directory=None):
+        # seeds of worlds are taken from rng of batch, so the same seed of batch gives the same worlds.
+        # if save_directory is None, worlds aren't saved
+        self.rng = Random(seed)
+        self.save_directory = save_directory
+        if save_directory is not None:
+            os.makedirs(save_directory, exist_ok=True)
+        self.worlds = [self.create(i) for i in range(number_of_worlds)]
+        self.alive = np.ones(number_of_worlds, dtype=bool)
+        self.ticks = 0  # simulation steps made by all worlds together
+
+    def create(self, i, seed=None):
+        save_path = None if self.save_directory is None else os.path.join(self.save_directory, f'world_{i}.sav')
+        # worlds of batch don't start worker processes, there are already a lot of worlds in one process
+        world = World(None, save_path, deterministic=True, worker_processes=False)
+        world.generate(self.rng.getrandbits(32) if seed is None else seed)
+        return world
+
+    def reset(self, i, seed=None):
+        # replaces world with a new one (e.g. after its character is dead)
+        if self.alive[i]:
+            self.worlds[i].delete()
+        self.worlds[i] = self.create(i, seed)
+        self.alive[i] = True
+
+    def step(self, actions=None):
+        # actions is array (number of worlds, ACTION_SIZE), if it's None characters do nothing.
+        # returns observations after step
+        step = 1000 / SIMULATION_RATE
+        if actions is not None:
+            actions = np.asarray(actions, dtype=np.float64).reshape(len(self.worlds), ACTION_SIZE)
+        for i, world in enumerate(self.worlds):
+            if not self.alive[i]:
+                continue
+            if actions is not None:
+                self.act(world, actions[i].tolist())
+            world.step(step)
+            self.ticks += 1
+            if world.character.hp_level.hp < 1:
+                # save of world is deleted as if user had played it
+                world.delete()
+                self.alive[i] = False
+        return self.observe()
+
+    def act(self, world, action):
+        move_x, move_y, look, attack = action
+        character = world.character
+        character.speeds.update({0: move_x > 0, 90: move_y > 0, 180: move_x < 0, 270: move_y < 0})
+        character.update_speed()
+        if not isnan(look):
+            world.turn_character(look % 360)
+        if attack:
+            world.attack()
+
+    def observe(self):
+        characters = np.full((len(self.worlds), CHARACTER_FEATURES), np.nan)
+        monsters = np.full((len(self.worlds), OBSERVED_MONSTERS, MONSTER_FEATURES), np.nan)
+        for i, world in enumerate(self.worlds):
+            character = world.character
+            x, y = character.rect.center
+            characters[i] = (x, y, character.hp_level.hp, character.view_direction,
+                             get_direction(character.speed_direction))
+            if not self.alive[i]:
+                continue
+            visible = world.monsters.query_rect(world.camera.rect)
+            if not visible:
+                continue
+            rows = np.array([(*monster.rect.center, monster.hp_level.hp, get_direction(monster.speed_direction))
+                             for monster in visible])
+            rows[:, :2] -= x, y
+            nearest = np.argsort(np.hypot(rows[:, 0], rows[:, 1]), kind='stable')[:OBSERVED_MONSTERS]
+            monsters[i, :len(nearest)] = rows[nearest]
+        return {'character': characters, 'monsters': monsters, 'alive': self.alive.copy()}
+
+    def close(self):
+        # worlds with alive characters are saved (if they have save path)
+        for world, alive in zip(self.worlds, self.alive):
+            if alive:
+                world.save()
@@ -0,0 +1,41 @@
+from collections import OrderedDict
+
+
+class LruCache:
+    # least recently used items are removed when total size of items is greater than max size.
+    # size of every item is 1 by default, so max size is max number of items,
+    # otherwise it's measured in whatever units sizes of items are given in (e.g. bytes).
+    # the last added item is never removed, even if it's bigger than max size
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.items = OrderedDict()  # key -> (value, size), least recently used items come first
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key):
+        # returns None if there is no such key
+        item = self.items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.items.move_to_end(key)
+        return item[0]
+
+    def put(self, key, value, size=1):
+        self.pop(key)
+        self.items[key] = value, size
+        self.size += size
+        while self.size > self.max_size and len(self.items) > 1:
+            _, (_, removed_size) = self.items.popitem(last=False)
+            self.size -= removed_size
+        return value
+
+    def pop(self, key):
+        item = self.items.pop(key, None)
+        if item is not None:
+            self.size -= item[1]
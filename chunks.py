@@ -0,0 +1,129 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+from pygame import Rect
+
+from helpers import to_px
+from constants import CHUNK_SIZE, CHUNK_RADIUS
+from world_objects import Stone, Tree, Monster
+from generation import place_objects
+from snapshot import get_records, write_snapshot, read_snapshot, CHUNKS_SUFFIX
+
+
+class ChunkManager:
+    # map is divided into square chunks.
+    # chunk is generated from seed of world when it's visited for the first time,
+    # so the same chunk of the same world always has the same objects.
+    # only chunks around camera are kept in memory,
+    # distant chunks are written to disk (on worker thread) and loaded again when camera approaches them.
+    # this way memory and tick cost depend only on the area around character and not on the size of map.
+    # objects that belong to chunks in memory are saved with the world itself
+    def __init__(self, world, seed, resident=()):
+        self.world = world
+        self.seed = seed
+        self.size = to_px(CHUNK_SIZE)
+        self.columns = world.map_rect.w // self.size
+        self.rows = world.map_rect.h // self.size
+        self.resident = set(resident)  # chunks in memory
+        self.evicted = {}  # chunk -> records of its objects, is used if world isn't saved to disk
+        self.directory = None if world.save_path is None else world.save_path + CHUNKS_SUFFIX
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.writes = {}  # chunk -> writing of its file
+        # chunks loaded from files that aren't removed yet. file is removed only when snapshot of world
+        # with this chunk in memory is written, otherwise objects of chunk would be lost if game stopped before it
+        self.loaded = set()
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            for chunk in self.resident:
+                # objects of chunks in memory are saved with world, so files of these chunks are outdated
+                if os.path.exists(self.get_path(chunk)):
+                    os.remove(self.get_path(chunk))
+
+    def get_path(self, chunk):
+        return os.path.join(self.directory, f'{chunk[0]}_{chunk[1]}.sav')
+
+    def get_chunk(self, x, y):
+        return int(x // self.size), int(y // self.size)
+
+    def get_rect(self, chunk):
+        return Rect(chunk[0] * self.size, chunk[1] * self.size, self.size, self.size)
+
+    def update(self, limit=1):
+        # loads chunks around camera and unloads distant ones.
+        # limit is max number of chunks loaded or unloaded at once, so there are no long pauses.
+        # the closest chunks are loaded first
+        column, row = self.get_chunk(*self.world.camera.rect.center)
+        needed = [(column + x, row + y)
+                  for x in range(-CHUNK_RADIUS, CHUNK_RADIUS + 1) for y in range(-CHUNK_RADIUS, CHUNK_RADIUS + 1)
+                  if 0 <= column + x < self.columns and 0 <= row + y < self.rows]
+        needed = sorted((chunk for chunk in needed if chunk not in self.resident),
+                        key=lambda chunk: abs(chunk[0] - column) + abs(chunk[1] - row))
+        # chunks are unloaded a bit farther than they are loaded,
+        # so they aren't loaded and unloaded all the time when camera moves along their border
+        distant = [chunk for chunk in self.resident
+                   if max(abs(chunk[0] - column), abs(chunk[1] - row)) > CHUNK_RADIUS + 1]
+        for chunk, future in list(self.writes.items()):
+            if future.done():
+                future.result()  # errors of writing are raised here
+                del self.writes[chunk]
+        for chunk in needed[:limit]:
+            self.load(chunk)
+        for chunk in distant[:limit]:
+            self.evict(chunk)
+        if needed[:limit] or distant[:limit]:
+            self.world.on_chunks_changed()
+
+    def load(self, chunk):
+        if chunk in self.writes:
+            self.writes.pop(chunk).result()  # chunk was unloaded recently and it's still being written
+        if chunk in self.evicted:
+            objects = [kind(*params) for kind, params in self.evicted.pop(chunk)]
+        elif self.directory is not None and os.path.exists(self.get_path(chunk)):
+            records = read_snapshot(self.get_path(chunk))[0]
+            objects = [kind(*params) for kind, params in records]
+            self.loaded.add(chunk)
+        else:
+            objects = self.generate(chunk)
+        for obj in objects:
+            self.world.add(obj)
+        self.resident.add(chunk)
+
+    def generate(self, chunk):
+        # every chunk has its own rng, so chunk doesn't depend on the order chunks are visited in
+        rng = Random(f'{self.seed} {chunk[0]} {chunk[1]}')
+        rect = self.get_rect(chunk)
+        # objects that are already in memory (e.g. monsters that came here from other chunks)
+        # shouldn't collide new objects
+        objects = [self.world.character, *self.world.static.query_rect(rect), *self.world.monsters.query_rect(rect)]
+        records = place_objects([Stone, Tree, Monster], rect, rng, [obj.rect for obj in objects])
+        return [kind(*params) for kind, params in records]
+
+    def evict(self, chunk):
+        # chunk owns objects whose centers are within it
+        rect = self.get_rect(chunk)
+        objects = [obj for grid in [self.world.static, self.world.monsters] for obj in grid.query_rect(rect)
+                   if rect.collidepoint(obj.rect.center)]
+        records = get_records(objects)
+        for obj in objects:
+            self.world.remove(obj)
+        if self.directory is None:
+            self.evicted[chunk] = records
+        else:
+            self.writes[chunk] = self.executor.submit(write_snapshot, records, self.get_path(chunk))
+        self.resident.discard(chunk)
+        self.loaded.discard(chunk)  # file of chunk is written again
+
+    def on_snapshot_saved(self, chunks):
+        # is called when snapshot of world with these chunks in memory is written.
+        # their objects are saved with world now, so their files are outdated
+        for chunk in self.loaded & set(chunks):
+            if os.path.exists(self.get_path(chunk)):
+                os.remove(self.get_path(chunk))
+        self.loaded -= set(chunks)
+
+    def close(self):
+        # waits until all chunks are written
+        self.executor.shutdown(wait=True)
+        for future in self.writes.values():
+            future.result()
+        self.writes = {}
@@ -0,0 +1,104 @@
+from math import hypot
+from pygame import Rect
+
+from cache import LruCache
+from constants import OVERLAP_CACHE_SIZE, MASK_EXTENTS_CACHE_SIZE
+from profiler import PROFILER
+
+# collision of two objects is checked in two stages:
+# 1) rects of objects should overlap and bounding circles of their masks should intersect.
+#    circle is centered in the center of object and contains all pixels of its mask at any rotation,
+#    so most of pairs are rejected without touching masks
+# 2) masks of objects overlap. masks are shared between objects of the same kind, size and rotation,
+#    so results are cached by masks and their relative position
+#    (mob that is pressed against an obstacle checks the same positions tick after tick)
+
+
+def get_shape_ratio(mask):
+    # distance from center of mask to its farthest pixel divided by width of mask
+    w, h = mask.get_size()
+    center_x, center_y = (w - 1) / 2, (h - 1) / 2
+    farthest = 0
+    # the farthest pixel of every connected part of mask is on its outline
+    # (outline of mask itself goes only around one of them)
+    for component in mask.connected_components():
+        for x, y in component.outline():
+            farthest = max(farthest, hypot(x - center_x, y - center_y))
+    return (farthest + 0.5) / w
+
+
+class Shapes:
+    # ratio of radius of bounding circle to size of object for every kind of objects.
+    # it's calculated once from the not scaled mask of kind (from every frame if kind is animated)
+    def __init__(self):
+        self.ratios = {}
+
+    def get_radius(self, obj, size):
+        # size is width of not rotated image of object
+        kind = obj.__class__
+        ratio = self.ratios.get(kind)
+        if ratio is None:
+            ratio = self.ratios[kind] = max(get_shape_ratio(mask) for mask in kind.get_source_masks())
+        # 1 px is added because scaled mask can be a bit bigger than scaled circle
+        return ratio * size + 1
+
+
+class OverlapCache:
+    # least recently used results of mask overlaps
+    def __init__(self, max_size):
+        self.items = LruCache(max_size)  # (mask, other mask, offset) -> masks overlap
+
+    def overlap(self, mask, other_mask, offset):
+        key = mask, other_mask, offset
+        result = self.items.get(key)
+        if result is None:
+            result = self.items.put(key, mask.overlap(other_mask, offset) is not None)
+        return result
+
+
+class MaskExtents:
+    # rect that bounds all pixels of mask (relative to top left corner of mask) for every mask in use.
+    # object is within area if this rect moved to object is within area,
+    # so there is no need to create a mask of area and count pixels
+    def __init__(self, max_size):
+        self.items = LruCache(max_size)  # mask -> rect
+
+    def get(self, mask):
+        extent = self.items.get(mask)
+        if extent is None:
+            rects = mask.get_bounding_rects()
+            extent = self.items.put(mask, rects[0].unionall(rects[1:]) if rects else Rect(0, 0, 0, 0))
+        return extent
+
+
+SHAPES = Shapes()
+OVERLAPS = OverlapCache(OVERLAP_CACHE_SIZE)
+EXTENTS = MaskExtents(MASK_EXTENTS_CACHE_SIZE)
+
+
+def collide(obj, other):
+    # both objects should have rect, mask and get_radius method
+    x, y = obj.rect.center
+    other_x, other_y = other.rect.center
+    if hypot(x - other_x, y - other_y) > obj.get_radius() + other.get_radius():
+        return False
+    if PROFILER.enabled:
+        PROFILER.count('mask checks')
+    offset = other.rect.x - obj.rect.x, other.rect.y - obj.rect.y
+    return OVERLAPS.overlap(obj.mask, other.mask, offset)
+
+
+def get_colliding(obj, objects):
+    # returns objects that collide obj. rects are checked first by pygame all at once
+    objects = list(objects)
+    return [objects[i] for i in obj.rect.collidelistall([other.rect for other in objects]) if collide(obj, objects[i])]
+
+
+def collides_any(obj, objects):
+    objects = list(objects)
+    return any(collide(obj, objects[i]) for i in obj.rect.collidelistall([other.rect for other in objects]))
+
+
+def mask_within_rect(obj, rect):
+    # checks that all pixels of mask of object are within rect
+    return rect.contains(EXTENTS.get(obj.mask).move(obj.rect.topleft))
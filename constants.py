@@ -1,10 +1,26 @@
 # DISPLAY:
 SCREEN_SIZE = (1080, 720)
 FPS = 60
+BACKGROUND_COLOR = '#097969'
+
+# HUD:
+HP_BAR_SIZE = (50, 5)  # px
+HP_BAR_GAP = 3  # px between health bar and mob under it
+HP_BAR_BACKGROUND = 'gray'  # color of empty part of health bar
+MAX_PARTICLES = 500  # particles of one kind that can exist at once
+
+# SIMULATION:
+# simulation runs with fixed time step that doesn't depend on how often frames are rendered
+SIMULATION_RATE = 60  # steps per second
+MAX_CATCH_UP_STEPS = 5  # max number of steps per frame, if game lags more than that, simulation slows down
 
 # PROJECT STRUCTURE:
 IMAGES_DIRECTORY = 'images'
-LAST_WORLD_FILE_NAME = 'last_world.txt'
+LAST_WORLD_FILE_NAME = 'last_world.sav'
+
+# AUTOSAVE:
+AUTOSAVE_PERIOD = 5  # seconds, changes of mobs are saved this often
+COMPACTION_PERIOD = 60  # seconds, the whole world is saved this often
 
 # SIZES OF OBJECTS:
 CAMERA_VIEW_HEIGHT = 10  # game units
@@ -15,4 +31,57 @@ CAMERA_VIEW_HEIGHT = 10  # game units
 # so users with different screen sizes have the same field of view
 
 # WORLD PROPERTIES:
-MAP_SIZE = (60, 60)  # units
+MAP_SIZE = (1000, 1000)  # units
+CHUNK_SIZE = 20  # units, map is divided into chunks that are generated and kept in memory separately
+CHUNK_RADIUS = 1  # chunks, chunks this close to the chunk with camera are kept in memory
+GRID_CELL_SIZE = 4  # units, size of cell of spatial grid that is used to find objects near some area
+NAVIGATION_CELL_SIZE = 1  # units, size of cell of grid that monsters use to find path around obstacles
+FLOW_FIELD_RADIUS = 20  # units, monsters farther from character than that don't bypass obstacles
+FLOW_FIELD_SWEEPS = 8  # sweeps of flow field calculation per tick, new field is ready in a few ticks
+PLACEMENT_ATTEMPTS = 30  # random positions tried for every generated object before it's skipped
+
+# LEVEL OF DETAIL:
+# monsters that aren't visible are simulated less accurately and less often
+NEAR_SCREEN_MARGIN = 5  # units, monsters within this distance from camera view are considered near
+NEAR_UPDATE_PERIOD = 3  # ticks
+FAR_UPDATE_PERIOD = 15  # ticks
+LOD_TIME_BUDGET = 3  # ms per tick for monsters that aren't visible
+# time can't be replayed, so in recorded sessions budget is a number of monsters instead
+LOD_SESSION_BUDGET = 100  # monsters per tick that aren't visible
+
+# MONSTER AI:
+# monsters on screen are steered in one batch and their decisions are made in worker processes
+# when there are a lot of them
+BATCH_STEERING_MIN_MONSTERS = 16  # if there are fewer monsters on screen, they are steered one by one
+AI_PROCESSES = None  # number of worker processes, None means one less than number of processor cores
+# (pool isn't used if there are fewer than 2 workers)
+AI_POOL_MIN_MONSTERS = 50  # if there are fewer monsters on screen, decisions are made on main thread
+AI_MAX_OBSTACLES = 4096  # max number of static objects in shared memory of workers
+# monsters on screen choose direction again (re-plan) only while there is time left in frame budget,
+# the rest of them keep moving in direction they chose before
+AI_TIME_BUDGET = 1  # ms per tick for re-planning of monsters on screen
+AI_SESSION_BUDGET = 100  # monsters re-planned per tick in recorded sessions (time can't be replayed)
+AI_NEAREST_SHARE = 0.5  # part of budget that is always given to monsters closest to character
+
+# BATCH SIMULATION:
+# many worlds are simulated in one process for bots and load testing (see batch.py)
+OBSERVED_MONSTERS = 8  # the nearest monsters on screen that are included in observation of world
+
+# CACHES:
+ROTATION_STEP = 5  # degrees, angles of rotated images of mobs are rounded to this value
+ROTATION_CACHE_SIZE = 64 * 1024 * 1024  # bytes, memory limit for rotated images and masks of mobs
+SCALED_IMAGES_CACHE_SIZE = 128 * 1024 * 1024  # bytes, memory limit for scaled images and masks of objects
+OVERLAP_CACHE_SIZE = 4096  # results of mask overlaps
+MASK_EXTENTS_CACHE_SIZE = 4096  # rects that bound pixels of masks
+# line of sight of monster is checked again only if it or its goal has moved farther than walking character moves
+# in this number of simulation steps (otherwise every step of character would make all lines be checked again)
+SIGHT_TOLERANCE = 2
+PREWARM_ROTATIONS = False  # calculate rotated images of all mobs when world is loaded
+STATIC_TILE_SIZE = 4  # units, background with static objects is rendered in square tiles of this size
+STATIC_LAYER_CACHE_SIZE = 32 * 1024 * 1024  # bytes, memory limit for rendered tiles of background
+
+# PROFILING:
+# time of stages of frame and counters can be shown on screen (toggled by F3) and written to trace file
+PROFILER_WINDOW = 120  # frames, percentiles are calculated over this many last frames
+PROFILE_VARIABLE = 'SURVIVOR_PROFILE'  # profiler is enabled from the start if this environment variable is set
+PROFILE_TRACE_VARIABLE = 'SURVIVOR_PROFILE_TRACE'  # path of trace file (.csv or json lines otherwise)
@@ -1,7 +1,21 @@
 from world_objects import *
+from spatial import SpatialGrid
+from navigation import NavigationGrid, FlowField
+from scheduler import LevelOfDetail, PlanningScheduler
+from snapshot import save_snapshot, load_snapshot, delete_snapshot
+from autosave import Autosave
+from chunks import ChunkManager
+from rendering import StaticLayer
+from presentation import Presenter
+from hud import Hud
+from profiler import PROFILER
+from decisions import DecisionPool
+from steering import BatchSteering
+from sight import LineOfSight
+from particles import BloodParticles
 from pygame.sprite import Group
 import pygame
-from random import uniform
+from random import getrandbits, Random
 
 
 class Game:
@@ -14,97 +28,249 @@ class Game:
         # when game is initialized start menu is shown
         self.mode = StartMenu(self)
         self.screen = screen
+        self.presenter = Presenter(screen)
 
     def tick(self, ticks):
-        self.mode.tick(ticks)
-        self.screen.blit(self.mode.image, (0, 0))
+        with PROFILER.scope('frame'):
+            self.mode.tick(ticks)
+            drawn_rects = self.mode.drawn_rects
+            if PROFILER.enabled and isinstance(self.mode, World):
+                # world redraws the whole frame every time, so overlay can be drawn right on it
+                drawn_rects = drawn_rects + [PROFILER.draw(self.mode.image)]
+            # every mode has image of current frame, regions of moving objects on it and flag of scrolling
+            with PROFILER.scope('present'):
+                self.presenter.present(self.mode.image, drawn_rects, self.mode.scrolled)
+        PROFILER.end_frame()
+
+    def start_world(self, seed=None, save_path=LAST_WORLD_FILE_NAME, deterministic=False):
+        world = World(self, save_path, deterministic)
+        world.generate(seed)
+        self.mode = world
+        return world
 
     def receive(self, event):
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            PROFILER.toggle()
+        self.presenter.receive(event)
         # game reacts on events differently depending on current mode
         self.mode.receive(event)
 
 
 class World:
 
-    def __init__(self, game):
+    def __init__(self, game, save_path=LAST_WORLD_FILE_NAME, deterministic=False, worker_processes=True):
         self.objects = Group()
         self.mobs = Group()
-        self.static = Group()
-        self.monsters = Group()
-        self.game = game
+        # static objects and monsters are stored in spatial grids,
+        # so objects near camera or near character can be found without iterating through the whole map
+        self.static = SpatialGrid()
+        self.monsters = SpatialGrid()
+        # static objects are drawn once onto cached background
+        self.static_layer = StaticLayer(self.static)
+        self.drawn_rects = []  # regions of moving objects on the last frame (in screen coordinates)
+        self.scrolled = True  # camera has moved since the previous frame
+        self.view_position = None  # position of camera on the previous frame
+        # all objects have fixed coordinates on map, camera only decides which part of the map is drawn
+        self.map_rect = Rect(0, 0, to_px(MAP_SIZE[0]), to_px(MAP_SIZE[1]))
+        self.accumulator = 0  # ms of time that hasn't been simulated yet
+        self.game = game  # can be None if world isn't shown to user (e.g. headless simulation)
+        self.save_path = save_path  # world isn't saved if it's None
+        # deterministic world does the same thing every time it gets the same input (see replay.py)
+        self.deterministic = deterministic
+        # every world has its own source of random numbers that is seeded with seed of world,
+        # so several worlds can exist in one process (see batch.py)
+        self.rng = Random()
+        self.autosave = None
+        self.closed = False  # world is saved or deleted, it isn't simulated anymore
+        # navigation grid is updated every time static objects are added or removed
+        self.navigation = NavigationGrid(self.map_rect)
+        self.flow_field = FlowField(self.navigation)
+        # worlds simulated in batch don't start worker processes of their own.
+        # deterministic worlds don't use them either: decisions of pool arrive one tick later
+        # and are made differently, so the same session would be played differently depending on number of cores
+        self.decisions = DecisionPool(self, worker_processes and not deterministic)
+        self.steering = BatchSteering(self)
+        self.sight = LineOfSight(self)  # lines between monsters and character that are blocked by static objects
+        self.planning = PlanningScheduler(self, deterministic)
 
     def tick(self, ticks):
+        # simulation runs with fixed time step that doesn't depend on how often frames are rendered.
+        # if frame took a long time, several steps are made to catch up (but not too many,
+        # otherwise game would never catch up if it's lagging), if it was short, no steps are made at all
+        if self.closed:  # the last frame after user has quit
+            return
+        step = 1000 / SIMULATION_RATE
+        self.accumulator += ticks
+        steps = 0
+        while self.accumulator >= step:
+            if steps == MAX_CATCH_UP_STEPS:
+                self.accumulator %= step
+                break
+            self.step(step)
+            if self.game.mode is not self:  # character is dead
+                return
+            self.accumulator -= step
+            steps += 1
+        self.render(self.accumulator / step)
+
+    def step(self, ticks):
+        if self.closed:
+            # background workers are stopped, so nothing can be saved, unloaded or sent to them
+            return
         if self.character.hp_level.hp < 1:
             self.delete()
+            return
 
-        self.camera.adjust()
-        self.image = self.camera.get_image(self.objects)
-
+        with PROFILER.scope('camera'):
+            self.camera.adjust()
+        with PROFILER.scope('chunks'):
+            self.chunks.update()
         x, y, w, h = self.camera.rect
 
         margin = to_px(Monster.speed_range[1]) + to_px(Monster.size_range[1])
         rect = Rect(x - margin, y - margin, w + 2 * margin, h + 2 * margin)
 
-        # monsters tries to move only if they are within camera view
+        # only monsters within camera view are simulated accurately,
+        # the rest of them are simulated by level of detail scheduler
         # otherwise game might be lagging if there are a lot of objects on map
-        monsters = Group(*filter(lambda obj: self.camera.rect.colliderect(obj.rect), self.monsters))
+        monsters = self.monsters.query_rect(self.camera.rect)
 
         # collision detection is done with objects within camera rect with margin
-        cant_collide = Group(*filter(lambda obj: rect.colliderect(obj.rect), self.static))
-
-        map_rect = self.camera.get_map_rect()
-
-        self.character.try_to_move(cant_collide, map_rect)
-        self.character.draw_hp(self.image)
-
-        for monster in monsters:
-            monster.draw_hp(self.image)
-            if monster.rect.collidepoint(self.character.rect.center):  # if monster is close enough to attack character
-                if monster.try_to_attack(self.character):
-                    self.objects.add(BloodParticiple.get_participles(self.character.rect.center))
-
-            monster.try_to_move_towards(self.character, cant_collide, map_rect)
-        self.objects.update(ticks)
-        pygame.display.flip()
+        with PROFILER.scope('candidates'):
+            cant_collide = self.static.query_rect(rect)
+        PROFILER.count('monsters on screen', len(monsters))
+
+        with PROFILER.scope('character'):
+            self.character.remember_position()
+            self.character.try_to_move(cant_collide, self.map_rect)
+
+        # directions around obstacles are recalculated only when character moves to another cell
+        with PROFILER.scope('flow field'):
+            self.flow_field.update(*self.character.rect.center)
+        with PROFILER.scope('monsters'):
+            # decisions that were sent to worker processes on the previous tick
+            decisions = self.decisions.collect()
+            # only some of monsters choose their direction again if there is a lot of them
+            replan = self.planning.select(monsters)
+            # all monsters on screen attack and move towards character in one batch
+            self.steering.tick(monsters, cant_collide, decisions, replan)
+            self.decisions.submit(monsters, self.character.rect.center)
+        # static objects don't change, so only mobs and particles are updated
+        self.character.update(ticks)
+        with PROFILER.scope('level of detail'):
+            self.lod.tick(ticks, monsters)
+        with PROFILER.scope('particles'):
+            self.particles.update(ticks)
+        if self.autosave is not None:
+            with PROFILER.scope('autosave'):
+                self.autosave.tick(ticks)
+
+    def render(self, alpha):
+        # alpha is part of simulation step that has passed since the last step
+        self.camera.adjust(alpha)
+        self.scrolled = self.camera.rect.topleft != self.view_position
+        self.view_position = self.camera.rect.topleft
+        monsters = self.monsters.query_rect(self.camera.rect)
+        # only objects within camera view are drawn
+        with PROFILER.scope('get image'):
+            self.image = self.camera.get_image(self.static_layer, [[self.character], monsters], alpha)
+            particle_rects = self.particles.draw(self.image, self.camera.rect)
+        # health bars are drawn over all objects
+        with PROFILER.scope('hud'):
+            self.drawn_rects = self.camera.drawn_rects + particle_rects + self.hud.draw(self.image, alpha)
+
+    def close(self):
+        # stops background workers, autosave shouldn't write anything after the world is saved or deleted
+        if self.closed:
+            return
+        self.closed = True
+        if self.autosave is not None:
+            self.autosave.close()
+        self.chunks.close()
+        self.decisions.close()
 
     def save(self):
-        with open(LAST_WORLD_FILE_NAME, 'w+') as file:
-            file.writelines(map(lambda obj: obj.__repr__() + '\n', self.objects))
+        self.close()
+        if self.save_path is not None:
+            save_snapshot(self.objects, self.save_path, self.chunks.seed, sorted(self.chunks.resident))
+            self.chunks.on_snapshot_saved(self.chunks.resident)
 
     def delete(self):
-        if os.path.exists(LAST_WORLD_FILE_NAME):
-            os.remove(LAST_WORLD_FILE_NAME)
-        self.game.mode = StartMenu(self.game)
-
-    def generate(self):
-        map_bounds = Rect(0, 0, to_px(MAP_SIZE[0]), to_px(MAP_SIZE[1]))
-
-        character = Character.get_random_object(map_bounds)
-        self.character = character
-        self.mobs.add(character)
-        self.objects.add(character)
-
-        monsters = Monster.get_random_objects(map_bounds, self.mobs)
-        self.monsters.add(monsters)
-        self.mobs.add(monsters)
-        self.objects.add(monsters)
-
-        for kind in [Stone, Tree]:
-            objects = kind.get_random_objects(map_bounds, self.mobs)
-            self.static.add(objects)
-            self.objects.add(objects)
-
-        self.camera = Camera(character, self.objects)
+        self.close()
+        if self.save_path is not None:
+            delete_snapshot(self.save_path)
+        if self.game is not None:
+            self.game.mode = StartMenu(self.game)
+
+    def generate(self, seed=None):
+        # the same seed always gives the same world
+        if seed is None:
+            seed = getrandbits(32)
+        self.rng.seed(seed)
+        self.add(Character.get_random_object(self.map_rect, rng=self.rng))
+        # the rest of objects are generated from seed of world when chunks of map are visited for the first time
+        self.chunks = ChunkManager(self, seed)
+        self.prepare()
+
+    def load(self):
+        objects, seed, chunks = load_snapshot(self.save_path)
+        self.rng.seed(seed)
+        for obj in objects:
+            self.add(obj)
+        self.chunks = ChunkManager(self, seed, chunks)
+        self.prepare()
+
+    def prepare(self):
+        # is called after world is generated or loaded
+        self.camera = Camera(self.character)
+        self.hud = Hud(self)
+        self.particles = BloodParticles(self.rng)  # particles aren't objects of world, they are only drawn
+        # all chunks around camera are loaded at once before the game starts
+        self.chunks.update(limit=None)
+        self.lod = LevelOfDetail(self, self.deterministic)
+        if self.save_path is not None:
+            self.autosave = Autosave(self)
+        if PREWARM_ROTATIONS:
+            for mob in self.mobs:
+                mob.warm_up_rotations()
 
     def add(self, obj):
         self.objects.add(obj)
         if isinstance(obj, Mob):
+            self.mobs.add(obj)
             if isinstance(obj, Monster):
+                obj.attack_timer = self.rng.randint(0, Monster.attack_speed)
                 self.monsters.add(obj)
             else:
                 self.character = obj
         else:
             self.static.add(obj)
+            self.navigation.add(obj)
+            self.static_layer.invalidate(obj.rect)
+
+    def remove(self, obj):
+        if not isinstance(obj, Mob):
+            self.navigation.remove(obj)
+            self.static_layer.invalidate(obj.rect)
+        obj.kill()
+
+    def on_chunks_changed(self):
+        # objects of chunks in memory are saved with world, so the whole world should be saved again
+        if self.autosave is not None:
+            self.autosave.request_snapshot()
+
+    def attack(self):
+        near = self.monsters.query_rect(self.character.rect)
+        for monster in get_colliding(self.character, near):
+            if self.character.try_to_attack(monster):
+                self.particles.emit(*monster.rect.center)
+
+    def turn_character(self, angle):
+        # after rotation character can collide only objects within circle around its center
+        x, y = self.character.rect.center
+        radius = hypot(*self.character.initial_image.get_size()) / 2
+        near = self.static.query_radius(x, y, radius)
+        self.character.try_to_rotate(angle, near, self.map_rect)
 
     def receive(self, event):
 
@@ -141,20 +307,22 @@ class World:
                 self.character.move_down(False)
 
         elif event.type == pygame.MOUSEBUTTONDOWN:
-            for monster in spritecollide(self.character, self.monsters, False, collide_mask):
-                if self.character.try_to_attack(monster):
-                    self.objects.add(BloodParticiple.get_participles(monster.rect.center))
+            self.attack()
 
         elif event.type == pygame.MOUSEMOTION:
-            angle = self.character.get_direction_to(*event.pos)
+            angle = self.character.get_direction_to(*self.camera.to_map(event.pos))
             if angle is not None:
-                self.character.try_to_rotate(angle, self.static, self.camera.get_map_rect())
+                self.turn_character(angle)
 
         elif event.type == pygame.QUIT:
             self.save()
 
 
 class StartMenu:
+    # menu never changes, so after it's shown once nothing has to be updated on display
+    drawn_rects = []
+    scrolled = False
+
     def get_btns_coords(self, button_width, button_height, screen_width, screen_height, number_of_buttons):
         # return  list of cords of left top corner of buttons
         screen_center = screen_width // 2
@@ -186,61 +354,56 @@ class StartMenu:
         if event.type == pygame.MOUSEBUTTONDOWN:
             cursor_pos = event.pos
             if self.new_btn.clicked(cursor_pos):
-                world = World(self.game)
-                world.generate()
-                self.game.mode = world
+                self.game.start_world()
             elif self.can_continue and self.continue_btn.clicked(cursor_pos):
                 world = World(self.game)
-                with open(LAST_WORLD_FILE_NAME, encoding='utf8') as file:
-                    while True:
-                        line = file.readline()
-                        if line:
-                            params = line.split()
-                            for kind in [Stone, Tree, Monster, Character]:
-                                if kind.__name__ == params[0]:
-                                    world.add(kind(*map(int, params[1:])))
-                                    break
-                        else:
-                            break
-                world.camera = Camera(world.character, world.objects)
+                world.load()
                 self.game.mode = world
 
     def tick(self, ticks):
-        pygame.display.flip()
+        pass
 
 
 class Camera:
-    def __init__(self, follow, objects):
+    # objects are never moved by camera.
+    # camera only stores which part of the map is visible (rect in map coordinates)
+    # and converts map coordinates to screen coordinates when objects are drawn
+    def __init__(self, follow):
         w = CAMERA_VIEW_HEIGHT * SCREEN_SIZE[0] / SCREEN_SIZE[1]
         h = CAMERA_VIEW_HEIGHT
         self.rect = Rect(0, 0, to_px(w), to_px(h))
-        self.x_on_map = 0
-        self.y_on_map = 0
         self.follow = follow
-        self.objects = objects
+        self.image = None  # frame surface is created once and reused for every frame
+        self.drawn_rects = []  # regions of objects drawn on the last frame
         self.adjust()
-        rect_on_map = Rect(self.x_on_map, self.y_on_map, self.rect.w, self.rect.h)
 
-    def update_coords_on_map(self):
+    def adjust(self, alpha=1):
+        # center camera on followed object but don't let it go beyond map borders
+        x, y = self.follow.get_drawing_rect(alpha).center
         half_w, half_h = self.rect.w // 2, self.rect.h // 2
-        self.x_on_map = min(to_px(MAP_SIZE[0]) - self.rect.w, max(0, self.follow.rect.centerx + self.x_on_map - half_w))
-        self.y_on_map = min(to_px(MAP_SIZE[1]) - self.rect.h, max(0, self.follow.rect.centery + self.y_on_map - half_h))
-
-    def adjust(self):
-        prev_x_on_map, prev_y_on_map = self.x_on_map, self.y_on_map
-        self.update_coords_on_map()
-        dif_x, dif_y = self.x_on_map - prev_x_on_map, self.y_on_map - prev_y_on_map
-        for obj in self.objects:
-            obj.move(-dif_x, -dif_y)
-
-    def get_map_rect(self):
-        return Rect(-self.x_on_map, -self.y_on_map, to_px(MAP_SIZE[0]), to_px(MAP_SIZE[1]))
-
-    def get_image(self, objects):
-        image = pygame.Surface(SCREEN_SIZE)
-        image.fill('#097969')
-        objects.draw(image)
-        return image
+        self.rect.x = min(to_px(MAP_SIZE[0]) - self.rect.w, max(0, x - half_w))
+        self.rect.y = min(to_px(MAP_SIZE[1]) - self.rect.h, max(0, y - half_h))
+
+    def offset(self):
+        # offset that should be applied to map coordinates to get screen coordinates
+        return -self.rect.x, -self.rect.y
+
+    def to_map(self, pos):
+        # convert screen coordinates (e.g. mouse position) to map coordinates
+        return pos[0] + self.rect.x, pos[1] + self.rect.y
+
+    def get_image(self, static_layer, layers, alpha=1):
+        # background with static objects is copied from cached tiles,
+        # only moving objects (layers of visible sprites) are drawn on top of it
+        if self.image is None:
+            self.image = pygame.Surface(SCREEN_SIZE)
+        static_layer.draw(self.image, self.rect)
+        offset = self.offset()
+        self.drawn_rects = []
+        for layer in layers:
+            self.drawn_rects.extend(self.image.blits(
+                [(obj.image, obj.get_drawing_rect(alpha).move(offset)) for obj in layer]))
+        return self.image
 
 
 class Button(pygame.rect.Rect):
@@ -255,40 +418,3 @@ class Button(pygame.rect.Rect):
 
     def clicked(self, cursor_pos):
         return self.collidepoint(*cursor_pos)
-
-
-class BloodParticiple(Sprite):
-    image = load_image('blood')
-    size_range = 5, 20
-    life_time_range = 0.7, 1.2
-    radius = 100
-    number = 10
-
-    def __init__(self, x, y):
-        super(BloodParticiple, self).__init__()
-        size = randint(*self.__class__.size_range)
-        resized = pygame.transform.scale(self.__class__.image, (size, size))
-        self.v_direction = get_random_rotation()
-        self.image = pygame.transform.rotate(resized, self.v_direction + 90)
-        self.rect = self.image.get_rect().move(x - size // 2, y - size // 2)
-        self.actual_coords = self.rect.x, self.rect.y
-        self.max_life_time = uniform(*self.__class__.life_time_range)
-        self.current_life_time = 0
-        self.v = self.__class__.radius / self.max_life_time  # speed depends on lifetime of participle
-
-    def update(self, ticks):
-        ticks = ticks / 1000  # ticks are measured in milliseconds
-        offset_x, offset_y = self.v * cos(self.v_direction) * ticks, self.v * -sin(self.v_direction) * ticks
-        self.actual_coords = self.actual_coords[0] + offset_x, self.actual_coords[1] + offset_y
-        self.rect = Rect(*self.actual_coords, *self.rect.size)
-        self.current_life_time += ticks
-        if self.current_life_time >= self.max_life_time:
-            self.kill()
-
-    @classmethod
-    def get_participles(cls, coords):
-        return Group([cls(*coords) for _ in range(cls.number)])
-
-    def move(self, x_offset, y_offset):
-        self.actual_coords = self.actual_coords[0] + x_offset, self.actual_coords[1] + y_offset
-        self.rect = Rect(self.rect.x + x_offset, self.rect.y + y_offset, self.rect.w, self.rect.h)
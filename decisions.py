@@ -0,0 +1,133 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from math import ceil
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from pygame import Rect
+
+from helpers import to_px
+from constants import (AI_PROCESSES, AI_POOL_MIN_MONSTERS, AI_MAX_OBSTACLES, NAVIGATION_CELL_SIZE,
+                       FLOW_FIELD_RADIUS)
+
+# shared memory is a header (number of obstacles, column and row of the first cell of flow field),
+# rects of static objects (x, y, w, h) and directions of flow field around the goal (nan if there is no direction)
+HEADER_SIZE = 3
+FLOW_FIELD_SIZE = 2 * ceil(FLOW_FIELD_RADIUS / NAVIGATION_CELL_SIZE) + 1  # cells
+
+shared = None  # arrays in shared memory of worker process: header, rects, flow field
+
+
+def get_arrays(buffer):
+    header = np.ndarray(HEADER_SIZE, dtype=np.int64, buffer=buffer)
+    offset = header.nbytes
+    rects = np.ndarray((AI_MAX_OBSTACLES, 4), dtype=np.int64, buffer=buffer, offset=offset)
+    offset += rects.nbytes
+    flow_field = np.ndarray((FLOW_FIELD_SIZE, FLOW_FIELD_SIZE), dtype=np.float64, buffer=buffer, offset=offset)
+    return header, rects, flow_field
+
+
+def get_shared_size():
+    return 8 * (HEADER_SIZE + AI_MAX_OBSTACLES * 4 + FLOW_FIELD_SIZE ** 2)
+
+
+def attach(name):
+    # is called once in every worker process
+    global shared
+    memory = SharedMemory(name)
+    shared = memory, *get_arrays(memory.buf)
+
+
+def decide(centers, goal, cell_size):
+    # is run in worker process. returns direction around obstacles for every monster center
+    # (nan if monster can move straight towards goal or flow field has no direction for it)
+    _, header, rects, flow_field = shared
+    number_of_rects, first_column, first_row = header
+    rects = rects[:number_of_rects]
+    goal_x, goal_y = goal
+    directions = np.full(len(centers), np.nan)
+    for i, (x, y) in enumerate(centers):
+        # only rects that overlap bounding box of line between monster and goal can cross this line
+        left, right, top, bottom = min(x, goal_x), max(x, goal_x), min(y, goal_y), max(y, goal_y)
+        near = rects[(rects[:, 0] <= right) & (rects[:, 0] + rects[:, 2] >= left)
+                     & (rects[:, 1] <= bottom) & (rects[:, 1] + rects[:, 3] >= top)]
+        if any(Rect(*rect).clipline(goal_x, goal_y, x, y) for rect in near.tolist()):
+            column, row = int(x // cell_size) - first_column, int(y // cell_size) - first_row
+            if 0 <= column < FLOW_FIELD_SIZE and 0 <= row < FLOW_FIELD_SIZE:
+                directions[i] = flow_field[column, row]
+    return directions
+
+
+class DecisionPool:
+    # monsters on screen decide where to go (straight to character or around obstacles along flow field)
+    # in worker processes, so the number of monsters game can handle grows with number of processor cores.
+    # centers of monsters are sent to workers after monsters have moved and decisions are used on the next tick.
+    # rects of static objects and flow field are put into shared memory and are rewritten only when they change.
+    # if there are only a few monsters on screen, decisions are made on main thread as before
+    # (sending them to other processes would cost more than making them).
+    # if pool isn't enabled or there is only one worker, decisions are always made on main thread
+    # (a single worker on a machine with one or two cores only adds sending data and one tick of lag)
+    def __init__(self, world, enabled=True):
+        self.world = world
+        self.processes = AI_PROCESSES or max(1, (os.cpu_count() or 1) - 1)
+        self.enabled = enabled and self.processes >= 2
+        self.cell_size = to_px(NAVIGATION_CELL_SIZE)
+        self.executor = None  # is started when there are enough monsters on screen for the first time
+        self.memory = None
+        self.arrays = None
+        self.obstacles_version = None  # version of navigation grid rects in shared memory are taken from
+        self.flow_field_state = None  # revision of flow field in shared memory
+        self.batches = []  # (monsters, future of their decisions)
+
+    def start(self):
+        self.memory = SharedMemory(create=True, size=get_shared_size())
+        self.arrays = get_arrays(self.memory.buf)
+        self.executor = ProcessPoolExecutor(self.processes, initializer=attach, initargs=(self.memory.name,))
+
+    def collect(self):
+        # returns monster -> direction around obstacles (or None) for monsters sent on the previous tick
+        decisions = {}
+        for monsters, future in self.batches:
+            for monster, direction in zip(monsters, future.result()):
+                decisions[monster] = None if np.isnan(direction) else float(direction)
+        self.batches = []
+        return decisions
+
+    def submit(self, monsters, goal):
+        if not self.enabled or len(monsters) < AI_POOL_MIN_MONSTERS or not self.update_shared():
+            return
+        centers = np.array([monster.rect.center for monster in monsters])
+        size = ceil(len(monsters) / self.processes)
+        for start in range(0, len(monsters), size):
+            future = self.executor.submit(decide, centers[start:start + size], goal, self.cell_size)
+            self.batches.append((monsters[start:start + size], future))
+
+    def update_shared(self):
+        # is called when workers don't use shared memory (all their results are collected).
+        # returns False if obstacles don't fit shared memory
+        if self.executor is None:
+            self.start()
+        header, rects, flow_field = self.arrays
+        navigation = self.world.navigation
+        if self.obstacles_version != navigation.version:
+            static = self.world.static.sprites()
+            if len(static) > AI_MAX_OBSTACLES:
+                return False
+            rects[:len(static)] = [tuple(obj.rect) for obj in static]
+            header[0] = len(static)
+            self.obstacles_version = navigation.version
+        flow = self.world.flow_field
+        if self.flow_field_state != flow.revision:
+            flow_field[:] = flow.directions
+            header[1:] = flow.first_cell
+            self.flow_field_state = flow.revision
+        return True
+
+    def close(self):
+        if self.executor is not None:
+            self.batches = []
+            self.executor.shutdown(wait=True)
+            self.executor = None
+            self.arrays = None
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
@@ -0,0 +1,58 @@
+from pygame import Rect
+
+from helpers import to_px
+from constants import GRID_CELL_SIZE, PLACEMENT_ATTEMPTS
+
+
+class Placement:
+    # rects of objects that are already placed in some area, split into square cells.
+    # new object may be placed only where its rect doesn't overlap any of them,
+    # so only rects in a few cells around candidate are checked instead of all objects in area.
+    # rect of object contains its whole mask, so objects that don't overlap by rects can't collide
+    def __init__(self, rects=()):
+        self.cell_size = to_px(GRID_CELL_SIZE)
+        self.cells = {}  # (column, row) -> rects that overlap this cell
+        for rect in rects:
+            self.add(rect)
+
+    def get_cells(self, rect):
+        size = self.cell_size
+        for column in range(rect.left // size, (rect.right - 1) // size + 1):
+            for row in range(rect.top // size, (rect.bottom - 1) // size + 1):
+                yield column, row
+
+    def fits(self, rect):
+        for cell in self.get_cells(rect):
+            if rect.collidelist(self.cells.get(cell, ())) != -1:
+                return False
+        return True
+
+    def add(self, rect):
+        for cell in self.get_cells(rect):
+            self.cells.setdefault(cell, []).append(rect)
+
+
+def get_rect(params):
+    # rect of object with given initial params (x, y, size, ...), sprite itself isn't needed for that
+    x, y, size = params[:3]
+    return Rect(x, y, size, size)
+
+
+def place_objects(kinds, area, rng, occupied=()):
+    # returns records (kind, params) of number_of_objects objects of every kind placed randomly within area.
+    # only params of objects are generated here, sprites are built later for the accepted ones.
+    # every object gets at most PLACEMENT_ATTEMPTS random positions,
+    # if area is too crowded and none of them fits, object is skipped.
+    # result depends only on rng and occupied rects, so the same seed always gives the same objects
+    placement = Placement(occupied)
+    records = []
+    for kind in kinds:
+        for _ in range(kind.number_of_objects):
+            for _ in range(PLACEMENT_ATTEMPTS):
+                params = kind.get_random_initial_params(area, rng)
+                rect = get_rect(params)
+                if placement.fits(rect):
+                    placement.add(rect)
+                    records.append((kind, params))
+                    break
+    return records
@@ -0,0 +1,112 @@
+import argparse
+import cProfile
+import os
+import pstats
+from time import perf_counter
+import pygame
+
+from constants import SIMULATION_RATE, SCREEN_SIZE
+from content import World, Game
+from replay import replay
+from batch import WorldBatch
+
+
+# runs simulation of generated worlds without window and rendering as fast as processor allows.
+# is used for soak-testing changes of monsters behaviour and for profiling the simulation
+# separately from drawing. worlds created here are never saved, so last game of user isn't affected.
+# recorded sessions (see replay.py) are replayed here with rendering, but without window
+
+def simulate(ticks, seed=None, profiler=None):
+    # returns number of simulated ticks (character can die earlier) and time it took in seconds.
+    # generation of world isn't included in time and profile
+    world = World(None, save_path=None)
+    world.generate(seed)
+    step = 1000 / SIMULATION_RATE
+    if profiler:
+        profiler.enable()
+    start = perf_counter()
+    simulated = 0
+    while simulated < ticks and world.character.hp_level.hp > 0:
+        world.step(step)
+        simulated += 1
+    elapsed = perf_counter() - start
+    if profiler:
+        profiler.disable()
+    world.close()
+    return simulated, elapsed
+
+
+def simulate_batch(number_of_worlds, ticks, seed=None, profiler=None):
+    # all worlds are simulated in one batch in lockstep.
+    # returns number of ticks simulated by all worlds together and time it took in seconds
+    batch = WorldBatch(number_of_worlds, seed)
+    if profiler:
+        profiler.enable()
+    start = perf_counter()
+    for _ in range(ticks):
+        batch.step()
+        if not batch.alive.any():
+            break
+    elapsed = perf_counter() - start
+    if profiler:
+        profiler.disable()
+    batch.close()
+    return batch.ticks, elapsed
+
+
+def replay_session(path, profiler=None):
+    # returns time of every frame in ms
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.init()
+    screen = pygame.display.set_mode(SCREEN_SIZE)
+    if profiler:
+        profiler.enable()
+    times = replay(Game(screen), path, paced=False)
+    if profiler:
+        profiler.disable()
+    pygame.quit()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run Survivor simulation without rendering.')
+    parser.add_argument('--ticks', type=int, default=SIMULATION_RATE * 60, help='ticks per world')
+    parser.add_argument('--worlds', type=int, default=1, help='number of worlds simulated one after another')
+    parser.add_argument('--seed', type=int, default=None, help='seed of the first world')
+    parser.add_argument('--profile', action='store_true', help='print the slowest functions')
+    parser.add_argument('--replay', metavar='PATH', help='replay recorded session instead of generated worlds')
+    parser.add_argument('--batch', action='store_true', help='simulate all worlds at once in lockstep')
+    args = parser.parse_args()
+
+    profiler = cProfile.Profile() if args.profile else None
+    if args.replay:
+        times = sorted(replay_session(args.replay, profiler))
+        if not times:
+            print('session has no frames')
+            return
+        print(f'{len(times)} frames in {sum(times) / 1000:.2f} s, frame time ms: '
+              f'p50 {times[len(times) // 2]:.2f}, p99 {times[min(len(times) - 1, int(len(times) * 0.99))]:.2f}, '
+              f'max {times[-1]:.2f}')
+        if profiler:
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+        return
+    if args.batch:
+        ticks, elapsed = simulate_batch(args.worlds, args.ticks, args.seed, profiler)
+        print(f'{args.worlds} worlds: {ticks} ticks in {elapsed:.2f} s ({ticks / elapsed:.0f} ticks per second)')
+        if profiler:
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+        return
+    total_ticks, total_time = 0, 0
+    for i in range(args.worlds):
+        seed = None if args.seed is None else args.seed + i
+        ticks, elapsed = simulate(args.ticks, seed, profiler)
+        total_ticks += ticks
+        total_time += elapsed
+        print(f'world {i + 1}: {ticks} ticks in {elapsed:.2f} s ({ticks / elapsed:.0f} ticks per second)')
+    print(f'total: {total_ticks} ticks in {total_time:.2f} s ({total_ticks / total_time:.0f} ticks per second)')
+    if profiler:
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+
+
+if __name__ == '__main__':
+    main()
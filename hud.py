@@ -0,0 +1,59 @@
+import pygame
+from pygame import Rect
+
+from constants import HP_BAR_SIZE, HP_BAR_GAP, HP_BAR_BACKGROUND
+
+
+class HealthBarAtlas:
+    # bars of every fill level (0 ... width of bar in px) are drawn once one under another on one surface,
+    # so drawing a bar is just blitting a part of this surface and hp changes don't create new surfaces.
+    # there is one atlas for every color of bars
+    def __init__(self, size=HP_BAR_SIZE):
+        self.size = size
+        self.images = {}  # color -> atlas
+
+    def get_image(self, color):
+        image = self.images.get(color)
+        if image is None:
+            w, h = self.size
+            image = pygame.Surface((w, h * (w + 1)))
+            if pygame.display.get_surface() is not None:
+                image = image.convert()
+            image.fill(HP_BAR_BACKGROUND)
+            for fill in range(1, w + 1):
+                image.fill(color, (0, fill * h, fill, h))
+            self.images[color] = image
+        return image
+
+    def get_area(self, fill):
+        # part of atlas with bar filled by fill px
+        w, h = self.size
+        return Rect(0, fill * h, w, h)
+
+
+class Hud:
+    # overlay that is drawn over the world: health bars above the character and monsters.
+    # all bars are drawn at once with Surface.blits after visible mobs are found in one place
+    def __init__(self, world):
+        self.world = world
+        self.atlas = HealthBarAtlas()
+
+    def get_visible_mobs(self):
+        # bars are drawn above mobs, so bars of mobs that are right below camera view are visible too
+        camera_rect = self.world.camera.rect
+        area = Rect(camera_rect.x, camera_rect.y, camera_rect.w, camera_rect.h + HP_BAR_SIZE[1] + HP_BAR_GAP)
+        return [self.world.character, *self.world.monsters.query_rect(area)]
+
+    def draw(self, surface, alpha=1):
+        # returns regions of surface bars are drawn on
+        w, h = HP_BAR_SIZE
+        offset_x, offset_y = self.world.camera.offset()
+        surface_rect = surface.get_rect()
+        bars = []
+        for mob in self.get_visible_mobs():
+            rect = mob.get_drawing_rect(alpha)
+            bar_rect = Rect(rect.centerx - w // 2 + offset_x, rect.y - h - HP_BAR_GAP + offset_y, w, h)
+            if surface_rect.colliderect(bar_rect):
+                hp_level = mob.hp_level
+                bars.append((self.atlas.get_image(hp_level.color), bar_rect, self.atlas.get_area(hp_level.get_fill())))
+        return surface.blits(bars)
@@ -1,19 +1,50 @@
+import argparse
 import pygame
-from constants import FPS
-from content import Game
-from world_objects import SCREEN
+from constants import FPS, SCREEN_SIZE
 
 # initializing game
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play Survivor.')
+    parser.add_argument('--record', metavar='PATH', help='start a new world and record the session to file')
+    parser.add_argument('--replay', metavar='PATH', help='replay recorded session')
+    parser.add_argument('--seed', type=int, default=None, help='seed of recorded world')
+    args = parser.parse_args()
+
     pygame.init()
     pygame.display.set_caption('Survivor')
-    running = True
-    clock = pygame.time.Clock()
-    game = Game(SCREEN)
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            game.receive(event)
-        game.tick(clock.tick(FPS))
+    # display should be created before images of objects are loaded,
+    # so images are converted to display format and drawn faster
+    screen = pygame.display.set_mode(SCREEN_SIZE)
+    from content import Game
+    from profiler import PROFILER
+    from replay import coalesce, start_session, Recorder, replay
+
+    game = Game(screen)
+    if args.replay:
+        replay(game, args.replay)
+    else:
+        recorder = None
+        if args.record:
+            recorder = Recorder(args.record, start_session(game, args.seed))
+            session_world = game.mode
+        running = True
+        clock = pygame.time.Clock()
+        while running:
+            # only the last mouse motion of frame is received
+            events = coalesce(pygame.event.get())
+            for event in events:
+                if event.type == pygame.QUIT:
+                    running = False
+                game.receive(event)
+            ticks = clock.tick(FPS)
+            if recorder is not None:
+                # session ends with its world
+                if game.mode is session_world:
+                    recorder.record(ticks, events)
+                if game.mode is not session_world or not running:
+                    recorder.close()
+                    recorder = None
+            if running:  # world is already saved after user has quit
+                game.tick(ticks)
+    PROFILER.close()
     pygame.quit()
@@ -0,0 +1,191 @@
+from math import ceil, degrees, atan2, sqrt
+import numpy as np
+from pygame.mask import Mask
+
+from helpers import to_px
+from constants import NAVIGATION_CELL_SIZE, FLOW_FIELD_RADIUS, FLOW_FIELD_SWEEPS
+
+NEIGHBOURS = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+# y axis of screen is directed down, but angles are measured with y axis directed up
+ANGLES = np.array([degrees(atan2(-y, x)) % 360 for x, y in NEIGHBOURS])
+
+
+class NavigationGrid:
+    # map split into square cells. cell is blocked if any static object covers part of it.
+    # static objects never move, so cells are updated only when static objects are added or removed
+    # (when world is created or chunks of map are loaded and unloaded)
+    def __init__(self, map_rect, static_objects=()):
+        self.cell_size = to_px(NAVIGATION_CELL_SIZE)
+        self.columns = ceil(map_rect.w / self.cell_size)
+        self.rows = ceil(map_rect.h / self.cell_size)
+        self.blocked = {}  # cell -> number of objects covering it
+        # cells next to obstacles are more expensive to go through,
+        # so monsters keep some distance from obstacles when it's possible (big monsters don't fit narrow paths)
+        self.near_blocked = {}  # cell -> number of blocked cells next to it
+        self.version = 0  # is increased every time obstacles change
+        self.cell_mask = Mask((self.cell_size, self.cell_size), True)
+        for obj in static_objects:
+            self.add(obj)
+
+    def get_covered_cells(self, obj):
+        cells = []
+        first_column, first_row = self.get_cell(obj.x(), obj.y())
+        last_column, last_row = self.get_cell(obj.rect.right - 1, obj.rect.bottom - 1)
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                offset = column * self.cell_size - obj.x(), row * self.cell_size - obj.y()
+                if obj.mask.overlap(self.cell_mask, offset):
+                    cells.append((column, row))
+        return cells
+
+    def add(self, obj):
+        for cell in self.get_covered_cells(obj):
+            self.blocked[cell] = self.blocked.get(cell, 0) + 1
+            if self.blocked[cell] == 1:
+                self.change_near_blocked(cell, 1)
+        self.version += 1
+
+    def remove(self, obj):
+        for cell in self.get_covered_cells(obj):
+            self.blocked[cell] -= 1
+            if not self.blocked[cell]:
+                del self.blocked[cell]
+                self.change_near_blocked(cell, -1)
+        self.version += 1
+
+    def change_near_blocked(self, cell, value):
+        column, row = cell
+        for x, y in NEIGHBOURS:
+            neighbour = column + x, row + y
+            self.near_blocked[neighbour] = self.near_blocked.get(neighbour, 0) + value
+            if not self.near_blocked[neighbour]:
+                del self.near_blocked[neighbour]
+
+    def get_cell(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def contains(self, cell):
+        column, row = cell
+        return 0 <= column < self.columns and 0 <= row < self.rows
+
+
+class FlowField:
+    # for every cell around the goal stores direction in which monster should move to get to the goal.
+    # all monsters chase the same goal, so flow field is shared by all of them
+    # and is recalculated only when goal moves to another cell or obstacles change.
+    # new field is calculated over several ticks (FLOW_FIELD_SWEEPS per tick), until it's ready
+    # monsters use the current one (goal has moved by only one cell since it was calculated)
+    def __init__(self, navigation):
+        self.navigation = navigation
+        self.radius = ceil(FLOW_FIELD_RADIUS / NAVIGATION_CELL_SIZE)
+        self.goal_cell = None
+        self.version = None  # version of navigation grid flow field was calculated for
+        self.revision = 0  # is increased every time new field replaces the current one
+        self.first_cell = None  # column and row of the top left cell of field
+        # directions in degrees (nan if there is no direction) for [column - first column, row - first row]
+        self.directions = None
+        self.calculation = None  # field that is being calculated
+
+    def update(self, x, y):
+        target = self.navigation.get_cell(x, y), self.navigation.version
+        if self.calculation is None and target != (self.goal_cell, self.version):
+            self.calculation = FlowFieldCalculation(self.navigation, *target, self.radius)
+        if self.calculation is not None:
+            # the first field is calculated at once, otherwise monsters wouldn't know where to go
+            sweeps = None if self.goal_cell is None else FLOW_FIELD_SWEEPS
+            if self.calculation.sweep(sweeps):
+                calculation = self.calculation
+                self.goal_cell, self.version = calculation.goal_cell, calculation.version
+                self.first_cell = calculation.first_cell
+                self.directions = calculation.get_directions()
+                self.revision += 1
+                self.calculation = None
+
+    def get_direction(self, x, y):
+        # returns None if point is in the goal cell or too far from it
+        column, row = self.navigation.get_cell(x, y)
+        column, row = column - self.first_cell[0], row - self.first_cell[1]
+        size = len(self.directions)
+        if 0 <= column < size and 0 <= row < size:
+            direction = self.directions[column, row]
+            if direction == direction:  # isn't nan
+                return float(direction)
+        return None
+
+
+class FlowFieldCalculation:
+    # shortest distances from cells within radius around goal cell to it.
+    # instead of dijkstra algorithm every sweep relaxes distances of all cells at once over numpy arrays
+    # (distance of cell is the smallest distance of its neighbour plus cost of step from it),
+    # field is ready when a sweep doesn't change anything.
+    # arrays have one extra cell on every side, so neighbours of every cell can be taken by index
+    def __init__(self, navigation, goal_cell, version, radius):
+        self.goal_cell = goal_cell
+        self.version = version
+        self.first_cell = goal_cell[0] - radius, goal_cell[1] - radius
+        size = 2 * radius + 1
+        first_column, first_row = self.first_cell
+        blocked = np.zeros((size + 2, size + 2), dtype=bool)
+        near_blocked = np.zeros((size + 2, size + 2), dtype=bool)
+        for cells, array in [(navigation.blocked, blocked), (navigation.near_blocked, near_blocked)]:
+            for column, row in cells:
+                if -1 <= column - first_column <= size and -1 <= row - first_row <= size:
+                    array[column - first_column + 1, row - first_row + 1] = True
+        # monsters can't leave map and field, but goal cell is reachable even if it's partly covered
+        columns = np.arange(first_column - 1, first_column + size + 1)[:, None]
+        rows = np.arange(first_row - 1, first_row + size + 1)[None, :]
+        unreachable = blocked | (columns < 0) | (columns >= navigation.columns) | (rows < 0) | (rows >= navigation.rows)
+        unreachable[[0, -1], :] = unreachable[:, [0, -1]] = True
+        goal = radius + 1, radius + 1
+        unreachable[goal] = False
+
+        # cost of step to every cell from its neighbour in every direction (inf if step isn't possible)
+        self.sources = []  # flat indices of neighbours cells are entered from
+        self.costs = []
+        flat = np.arange((size + 2) ** 2).reshape(size + 2, size + 2)
+        inner = slice(1, size + 1)
+        for x, y in NEIGHBOURS:
+            source = (slice(1 - x, size + 1 - x), slice(1 - y, size + 1 - y))
+            cost = np.where(near_blocked[inner, inner], 2.0, 1.0) * (sqrt(2) if x and y else 1)
+            forbidden = unreachable[inner, inner].copy()
+            if x and y:
+                # monster can't cut corners of obstacles
+                forbidden |= blocked[inner, slice(1 - y, size + 1 - y)] | blocked[slice(1 - x, size + 1 - x), inner]
+            cost[forbidden] = np.inf
+            self.sources.append(flat[source])
+            self.costs.append(cost)
+        self.sources = np.stack(self.sources)
+        self.costs = np.stack(self.costs)
+        self.distances = np.full((size + 2, size + 2), np.inf)
+        self.distances[goal] = 0
+        self.goal = goal
+
+    def sweep(self, limit=None):
+        # makes at most limit sweeps (or as many as needed if it's None), returns True if field is ready
+        size = len(self.distances) - 2
+        inner = self.distances[1:size + 1, 1:size + 1]  # view, distances are changed in place
+        sweeps = 0
+        while limit is None or sweeps < limit:
+            sweeps += 1
+            relaxed = (self.distances.ravel()[self.sources] + self.costs).min(axis=0)
+            if not (relaxed < inner).any():
+                return True
+            np.minimum(inner, relaxed, out=inner)
+        return False
+
+    def get_directions(self):
+        # every cell points to the neighbour through which path to goal is the shortest
+        # (distance of neighbour plus cost of step to it, so steps that cut corners of obstacles aren't taken).
+        # blocked cells next to reachable ones get directions too
+        # because center of monster can be in a cell that is partly covered by an obstacle
+        size = len(self.distances) - 2
+        costs = np.full((len(NEIGHBOURS), size + 2, size + 2), np.inf)
+        costs[:, 1:size + 1, 1:size + 1] = self.costs
+        # neighbour in direction (x, y) of cell is the cell that is entered from direction (-x, -y)
+        paths = np.stack([(self.distances.ravel() + costs[i].ravel())[self.sources[NEIGHBOURS.index((-x, -y))]]
+                          for i, (x, y) in enumerate(NEIGHBOURS)])
+        shortest = paths.argmin(axis=0)  # the first of equally short paths is taken
+        directions = ANGLES[shortest]
+        directions[np.isinf(paths.min(axis=0))] = np.nan
+        directions[self.goal[0] - 1, self.goal[1] - 1] = np.nan
+        return directions
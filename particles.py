@@ -0,0 +1,99 @@
+import numpy as np
+import pygame
+
+from helpers import load_image
+from constants import ROTATION_STEP, MAX_PARTICLES
+
+
+class ParticleSystem:
+    # particles aren't sprites: positions, speeds and lifetimes of all particles are stored in numpy arrays
+    # and are updated for all particles at once, so hundreds of particles cost almost the same as a few.
+    # images of particles are taken from a pool of resized and rotated textures that are made only once.
+    # number of particles is limited, particles that don't fit are simply not emitted
+    image = None
+    size_range = 1, 1  # px
+    life_time_range = 1, 1  # seconds
+    radius = 0  # px, distance particle flies during its lifetime
+    number = 0  # particles per emission
+
+    def __init__(self, rng, capacity=MAX_PARTICLES):
+        # rng is random.Random of world particles belong to
+        self.capacity = capacity
+        self.count = 0  # alive particles are always at the beginning of arrays
+        self.centers = np.zeros((capacity, 2))
+        self.speeds = np.zeros((capacity, 2))  # px per second
+        self.ages = np.zeros(capacity)  # seconds
+        self.life_times = np.zeros(capacity)
+        self.textures = np.zeros(capacity, dtype=int)  # index of texture in pool
+        self.pool = {}  # index of texture -> image
+        # seed is taken from rng of world, so particles are the same every time world is replayed
+        self.rng = np.random.default_rng(rng.getrandbits(64))
+
+    def get_texture(self, index):
+        # index is made of size of particle and its direction rounded to ROTATION_STEP
+        image = self.pool.get(index)
+        if image is None:
+            buckets = 360 // ROTATION_STEP
+            size, bucket = divmod(index, buckets)
+            resized = pygame.transform.scale(self.__class__.image, (size, size))
+            # particle flies in the direction of its round end
+            image = pygame.transform.rotate(resized, bucket * ROTATION_STEP + 90)
+            self.pool[index] = image
+        return image
+
+    def emit(self, x, y):
+        start = self.count
+        end = min(self.capacity, start + self.__class__.number)
+        number = end - start
+        if not number:
+            return
+        min_size, max_size = self.__class__.size_range
+        sizes = self.rng.integers(min_size, max_size + 1, number)
+        buckets = self.rng.integers(0, 360 // ROTATION_STEP, number)
+        directions = np.radians(buckets * ROTATION_STEP)
+        life_times = self.rng.uniform(*self.__class__.life_time_range, number)
+        speeds = self.__class__.radius / life_times  # speed depends on lifetime of particle
+        self.centers[start:end] = x, y
+        self.speeds[start:end, 0] = speeds * np.cos(directions)
+        self.speeds[start:end, 1] = -speeds * np.sin(directions)
+        self.ages[start:end] = 0
+        self.life_times[start:end] = life_times
+        self.textures[start:end] = sizes * (360 // ROTATION_STEP) + buckets
+        self.count = end
+
+    def update(self, ticks):
+        count = self.count
+        seconds = ticks / 1000  # ticks are measured in milliseconds
+        self.centers[:count] += self.speeds[:count] * seconds
+        self.ages[:count] += seconds
+        alive = self.ages[:count] < self.life_times[:count]
+        if not alive.all():
+            # alive particles are moved to the beginning of arrays
+            self.count = int(alive.sum())
+            for array in [self.centers, self.speeds, self.ages, self.life_times, self.textures]:
+                array[:self.count] = array[:count][alive]
+
+    def draw(self, surface, view_rect):
+        # view_rect is part of the map shown on surface. returns regions of surface particles are drawn on
+        centers = self.centers[:self.count] - view_rect.topleft
+        # particles whose centers are a bit beyond view are still partly visible
+        margin = self.__class__.size_range[1]
+        x, y = centers[:, 0], centers[:, 1]
+        visible = np.flatnonzero((x > -margin) & (x < view_rect.w + margin) & (y > -margin) & (y < view_rect.h + margin))
+        blits = []
+        for i in visible:
+            image = self.get_texture(int(self.textures[i]))
+            rect = image.get_rect(center=(int(centers[i, 0]), int(centers[i, 1])))
+            blits.append((image, rect))
+        return surface.blits(blits)
+
+    def __len__(self):
+        return self.count
+
+
+class BloodParticles(ParticleSystem):
+    image = load_image('blood')
+    size_range = 5, 20
+    life_time_range = 0.7, 1.2
+    radius = 100
+    number = 10
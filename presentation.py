@@ -0,0 +1,34 @@
+import pygame
+
+# window was covered or restored, so display has lost its contents and should be updated entirely
+EXPOSE_EVENTS = pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE
+
+
+class Presenter:
+    # copies frames of current game mode to display, exactly once per frame.
+    # most of the time only small part of frame changes (mobs move while camera stands still,
+    # start menu doesn't change at all), so only changed regions are copied and updated on display.
+    # the whole display is updated only when image of another mode is shown, when view has scrolled
+    # or when window has been exposed
+    def __init__(self, screen):
+        self.screen = screen
+        self.image = None  # image presented last time
+        self.drawn_rects = []  # regions of moving objects on the last presented frame
+
+    def receive(self, event):
+        if event.type in EXPOSE_EVENTS:
+            self.image = None  # next frame is presented entirely
+
+    def present(self, image, drawn_rects, scrolled=False):
+        # drawn_rects are regions of image where moving objects are drawn on this frame
+        if image is not self.image or scrolled:
+            self.screen.blit(image, (0, 0))
+            pygame.display.flip()
+        else:
+            # objects should be erased where they were on the last frame and drawn where they are now
+            dirty_rects = self.drawn_rects + drawn_rects
+            if dirty_rects:
+                self.screen.blits([(image, rect, rect) for rect in dirty_rects], False)
+                pygame.display.update(dirty_rects)
+        self.image = image
+        self.drawn_rects = drawn_rects
@@ -0,0 +1,140 @@
+import csv
+import json
+import os
+from collections import deque
+from time import perf_counter
+import pygame
+
+from constants import PROFILER_WINDOW, PROFILE_VARIABLE, PROFILE_TRACE_VARIABLE
+
+
+class Scope:
+    # measures time of one stage of frame, time of all entries of stage during frame is summed up
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+    def __exit__(self, *exception):
+        times = self.profiler.times
+        times[self.name] = times.get(self.name, 0) + (perf_counter() - self.start) * 1000
+
+
+class DisabledScope:
+    # is returned instead of scope when profiler is disabled, so measuring costs almost nothing
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exception):
+        pass
+
+
+class Profiler:
+    # collects time of named stages of frame (ms) and counters (e.g. number of collision checks).
+    # values of the last PROFILER_WINDOW frames are kept to show their median and 99th percentile on screen.
+    # values of every frame can also be written to trace file (csv or json lines, depending on extension).
+    # profiler is enabled by environment variable or toggled by key during the game,
+    # when it's disabled scopes and counters do nothing
+    def __init__(self):
+        self.enabled = bool(os.environ.get(PROFILE_VARIABLE))
+        self.scopes = {}  # name -> scope
+        self.disabled_scope = DisabledScope()
+        self.times = {}  # stage -> ms during current frame
+        self.counters = {}  # counter -> value during current frame
+        self.history = {}  # stage or counter -> values of the last frames
+        self.frame_number = 0
+        self.font = None
+        self.trace = None
+        self.trace_writer = None
+        trace_path = os.environ.get(PROFILE_TRACE_VARIABLE)
+        if trace_path:
+            self.open_trace(trace_path)
+
+    def scope(self, name):
+        # usage: with PROFILER.scope('name'): ...
+        if not self.enabled:
+            return self.disabled_scope
+        scope = self.scopes.get(name)
+        if scope is None:
+            scope = self.scopes[name] = Scope(self, name)
+        return scope
+
+    def count(self, name, value=1):
+        # in hot loops call is additionally guarded by 'if PROFILER.enabled'
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.times, self.counters, self.history = {}, {}, {}
+
+    def end_frame(self):
+        # is called once per frame after it's presented
+        if not self.enabled:
+            return
+        self.frame_number += 1
+        for values in [self.times, self.counters]:
+            for name, value in values.items():
+                self.history.setdefault(name, deque(maxlen=PROFILER_WINDOW)).append(value)
+        if self.trace is not None:
+            self.write_frame()
+        self.times, self.counters = {}, {}
+
+    def get_stats(self):
+        # name -> (median, 99th percentile) of the last frames
+        stats = {}
+        for name, values in self.history.items():
+            values = sorted(values)
+            stats[name] = values[len(values) // 2], values[min(len(values) - 1, int(len(values) * 0.99))]
+        return stats
+
+    def draw(self, surface):
+        # draws table of stats (stages in ms, then counters) in top left corner of surface,
+        # returns region it's drawn on
+        if self.font is None:
+            self.font = pygame.font.Font(None, 20)
+        stats = self.get_stats()
+        rows = [('ms', 'p50', 'p99')]
+        for names in [self.get_stages(), self.get_counters()]:
+            rows.extend((name, f'{stats[name][0]:.2f}', f'{stats[name][1]:.2f}') for name in names)
+        height = self.font.get_linesize()
+        columns = [5, 160, 220]  # x of left borders of columns
+        rect = pygame.Rect(0, 0, 280, height * len(rows) + 10)
+        surface.fill('black', rect)
+        surface.blits([(self.font.render(text, True, 'white'), (x, 5 + i * height))
+                       for i, row in enumerate(rows) for x, text in zip(columns, row)], False)
+        return rect
+
+    def get_stages(self):
+        return sorted(name for name in self.history if name in self.scopes)
+
+    def get_counters(self):
+        return sorted(name for name in self.history if name not in self.scopes)
+
+    def open_trace(self, path):
+        self.trace = open(path, 'w', newline='')
+        if path.endswith('.csv'):
+            self.trace_writer = csv.writer(self.trace)
+            self.trace_writer.writerow(['frame', 'kind', 'name', 'value'])
+
+    def write_frame(self):
+        if self.trace_writer is not None:
+            self.trace_writer.writerows([self.frame_number, 'time', name, value] for name, value in self.times.items())
+            self.trace_writer.writerows([self.frame_number, 'counter', name, value]
+                                        for name, value in self.counters.items())
+        else:
+            # one json object per line, so trace can be read while it's being written
+            frame = {'frame': self.frame_number, 'times': self.times, 'counters': self.counters}
+            self.trace.write(json.dumps(frame) + '\n')
+
+    def close(self):
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+
+
+PROFILER = Profiler()
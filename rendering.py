@@ -0,0 +1,57 @@
+import pygame
+from pygame import Rect
+
+from cache import LruCache
+from helpers import to_px
+from constants import STATIC_TILE_SIZE, STATIC_LAYER_CACHE_SIZE, BACKGROUND_COLOR
+
+
+class StaticLayer:
+    # stones and trees never move, so they are drawn once onto background together with grass.
+    # background is split into square tiles, only tiles within camera view are rendered and blitted,
+    # so frame doesn't depend on the number of static objects on the map.
+    # tiles are rendered when they are needed for the first time, least recently used tiles are removed
+    # when cache takes too much memory. tiles are rendered again when static objects on them change
+    # (e.g. when chunk of map is loaded or unloaded)
+    def __init__(self, static_objects, max_size=STATIC_LAYER_CACHE_SIZE):
+        self.static_objects = static_objects  # spatial grid
+        self.tile_size = to_px(STATIC_TILE_SIZE)
+        self.tiles = LruCache(max_size)  # (column, row) -> surface, size is in bytes
+
+    def get_tiles_range(self, rect):
+        size = self.tile_size
+        return rect.left // size, rect.top // size, (rect.right - 1) // size, (rect.bottom - 1) // size
+
+    def get_tile(self, tile):
+        image = self.tiles.get(tile)
+        if image is None:
+            image = self.render_tile(tile)
+            self.tiles.put(tile, image, self.tile_size ** 2 * image.get_bytesize())
+        return image
+
+    def render_tile(self, tile):
+        size = self.tile_size
+        rect = Rect(tile[0] * size, tile[1] * size, size, size)
+        image = pygame.Surface((size, size))
+        # tiles have no transparency, so they are converted to display format without alpha
+        if pygame.display.get_surface() is not None:
+            image = image.convert()
+        image.fill(BACKGROUND_COLOR)
+        offset = -rect.x, -rect.y
+        image.blits([(obj.image, obj.rect.move(offset)) for obj in self.static_objects.query_rect(rect)], False)
+        return image
+
+    def invalidate(self, rect):
+        # is called when static object within rect is added or removed
+        first_column, first_row, last_column, last_row = self.get_tiles_range(rect)
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                self.tiles.pop((column, row))
+
+    def draw(self, surface, view_rect):
+        # draws part of background within view_rect (in map coordinates) onto surface
+        size = self.tile_size
+        first_column, first_row, last_column, last_row = self.get_tiles_range(view_rect)
+        surface.blits([(self.get_tile((column, row)), (column * size - view_rect.x, row * size - view_rect.y))
+                       for column in range(first_column, last_column + 1)
+                       for row in range(first_row, last_row + 1)], False)
@@ -0,0 +1,103 @@
+import json
+from random import getrandbits
+from time import perf_counter
+import pygame
+
+from constants import FPS
+
+# session is a game started from seed together with input of user and duration of every frame.
+# world of session is deterministic, so replaying the same input with the same durations of frames
+# gives exactly the same game. sessions are recorded to compare how fast the same game runs before
+# and after a change (in window or without it, see headless.py).
+# file of session is json lines: header with seed, then one line per frame with its duration and events
+
+# only events game reacts on are recorded and only attributes game uses are kept
+RECORDED_EVENTS = pygame.KEYDOWN, pygame.KEYUP, pygame.MOUSEBUTTONDOWN, pygame.MOUSEMOTION, pygame.QUIT
+RECORDED_ATTRIBUTES = 'key', 'pos', 'button'
+
+
+def coalesce(events):
+    # every mouse motion rotates character, but only the last position of mouse during frame matters.
+    # order of the rest of events is kept
+    motions = [i for i, event in enumerate(events) if event.type == pygame.MOUSEMOTION]
+    skipped = set(motions[:-1])
+    return [event for i, event in enumerate(events) if i not in skipped]
+
+
+def encode(event):
+    data = {'type': event.type}
+    for name in RECORDED_ATTRIBUTES:
+        if name in event.dict:
+            data[name] = event.dict[name]
+    return data
+
+
+def decode(data):
+    attributes = {name: tuple(value) if isinstance(value, list) else value
+                  for name, value in data.items() if name != 'type'}
+    return pygame.event.Event(data['type'], attributes)
+
+
+def start_session(game, seed=None):
+    # sessions don't overwrite the last game of user
+    if seed is None:
+        seed = getrandbits(32)
+    game.start_world(seed, save_path=None, deterministic=True)
+    return seed
+
+
+class Recorder:
+    def __init__(self, path, seed):
+        self.file = open(path, 'w')
+        self.file.write(json.dumps({'seed': seed}) + '\n')
+        self.frame_number = 0
+
+    def record(self, ticks, events):
+        # ticks are ms the frame has lasted, events are received before the frame
+        events = [encode(event) for event in events if event.type in RECORDED_EVENTS]
+        self.file.write(json.dumps({'frame': self.frame_number, 'ticks': ticks, 'events': events}) + '\n')
+        self.frame_number += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_session(path):
+    # returns seed and list of frames (ticks, events)
+    with open(path) as file:
+        seed = json.loads(file.readline())['seed']
+        frames = []
+        for line in file:
+            frame = json.loads(line)
+            frames.append((frame['ticks'], [decode(data) for data in frame['events']]))
+    return seed, frames
+
+
+def replay(game, path, paced=True):
+    # plays recorded session from the beginning. if it's paced, frames are shown not faster than FPS
+    # and window can be closed, otherwise frames are made as fast as possible.
+    # returns time every frame took (ms)
+    seed, frames = read_session(path)
+    start_session(game, seed)
+    world = game.mode
+    clock = pygame.time.Clock()
+    times = []
+    for ticks, events in frames:
+        if paced:
+            if any(event.type == pygame.QUIT for event in pygame.event.get()):
+                break
+            clock.tick(FPS)
+        if game.mode is not world:  # character is dead
+            break
+        start = perf_counter()
+        for event in events:
+            game.receive(event)
+        if any(event.type == pygame.QUIT for event in events):
+            break
+        game.tick(ticks)
+        times.append((perf_counter() - start) * 1000)
+    if game.mode is world:
+        world.close()
+    return times
@@ -0,0 +1,153 @@
+from collections import deque
+from math import hypot
+from time import perf_counter
+
+from helpers import to_px
+from constants import (NEAR_SCREEN_MARGIN, NEAR_UPDATE_PERIOD, FAR_UPDATE_PERIOD, LOD_TIME_BUDGET, LOD_SESSION_BUDGET,
+                       AI_TIME_BUDGET, AI_SESSION_BUDGET, AI_NEAREST_SHARE)
+from profiler import PROFILER
+
+
+class LevelOfDetail:
+    # monsters are simulated with different accuracy depending on how far they are from camera:
+    # 1) on screen - every tick with rotation, sliding along obstacles and attacks (is done by world itself)
+    # 2) near screen - every NEAR_UPDATE_PERIOD ticks, monster moves several ticks at once
+    #    without rotation and sliding, only obstacles right next to it are checked
+    # 3) far from screen - in the same way as near ones,
+    #    but every monster is visited only once in FAR_UPDATE_PERIOD ticks (or even less often)
+    # near and far monsters follow flow field, monsters outside of it go straight to character.
+    # near and far monsters are simulated only while there is time left in frame budget,
+    # monsters that didn't get their turn wait for the next one.
+    # this way world stays alive and tick cost doesn't grow with the number of monsters on map.
+    # if world has to be deterministic (recorded sessions), budget is a number of monsters instead of time
+    def __init__(self, world, deterministic=False):
+        self.world = world
+        self.time = 0  # ms since world was loaded, is used to find out how much time monster has missed
+        self.tick_number = 0
+        self.queue = deque()  # far monsters waiting for their turn
+        self.budget = LOD_TIME_BUDGET / 1000  # seconds
+        self.deterministic = deterministic
+        self.deadline = 0
+        self.advanced = 0  # monsters advanced during current tick
+        self.deferred = 0  # number of near monsters that didn't get their turn because of frame budget
+
+    def out_of_budget(self):
+        if self.deterministic:
+            return self.advanced >= LOD_SESSION_BUDGET
+        return perf_counter() > self.deadline
+
+    def tick(self, ticks, on_screen):
+        self.time += ticks
+        self.tick_number += 1
+        # monsters on screen have already moved, but their attack timers should be updated
+        for monster in on_screen:
+            monster.update(self.get_elapsed(monster))
+
+        self.deadline = perf_counter() + self.budget
+        self.advanced = 0
+        camera_rect = self.world.camera.rect
+        margin = to_px(NEAR_SCREEN_MARGIN)
+        near_rect = camera_rect.inflate(2 * margin, 2 * margin)
+
+        if self.tick_number % NEAR_UPDATE_PERIOD == 0:
+            near = [monster for monster in self.world.monsters.query_rect(near_rect)
+                    if not camera_rect.colliderect(monster.rect)]
+            for i, monster in enumerate(near):
+                if self.out_of_budget():
+                    self.deferred += len(near) - i
+                    return
+                self.advance(monster)
+
+        if not self.queue and self.tick_number % FAR_UPDATE_PERIOD == 0:
+            self.queue.extend(self.world.monsters)
+        while self.queue and not self.out_of_budget():
+            monster = self.queue.popleft()
+            # near and visible monsters are simulated more often, killed monsters aren't simulated at all
+            if monster.alive() and not near_rect.colliderect(monster.rect):
+                self.advance(monster)
+
+    def get_elapsed(self, monster):
+        elapsed = self.time - monster.simulated_at
+        monster.simulated_at = self.time
+        return elapsed
+
+    def advance(self, monster):
+        self.advanced += 1
+        elapsed = self.get_elapsed(monster)
+        monster.update(elapsed)
+        # monsters that are too far from character to find path to it (outside of flow field)
+        # go straight to character, they stop when they run into an obstacle until flow field reaches them
+        direction = self.world.flow_field.get_direction(*monster.rect.center)
+        if direction is None:
+            direction = monster.get_direction_to(*self.world.character.rect.center)
+        if direction is not None:
+            # if monster has been waiting for too long, it shouldn't jump too far at once
+            monster.try_to_advance(direction, min(elapsed, 1000), self.world.static, self.world.map_rect)
+        # movement of monsters that aren't visible isn't interpolated
+        monster.remember_position()
+
+
+class PlanningScheduler:
+    # decides which monsters on screen re-plan (choose direction to character or around obstacles) this tick.
+    # monster doesn't re-plan if nothing has changed since its last plan (neither monster nor character
+    # has moved and obstacles and flow field are the same), its plan would be the same.
+    # the rest of monsters re-plan while there is time left in frame budget:
+    # part of budget is given to monsters closest to character, the rest of it to monsters that have been
+    # waiting for the longest time (round robin). monsters that don't re-plan keep their last direction.
+    # time of re-planning is measured by steering, so budget is converted to number of monsters
+    def __init__(self, world, deterministic=False):
+        self.world = world
+        self.deterministic = deterministic
+        self.budget = AI_TIME_BUDGET / 1000  # seconds
+        self.cost = 0  # estimated time of re-planning one monster (seconds), 0 until it's measured
+        self.tick_number = 0
+        self.skipped = 0  # re-plans that weren't needed
+        self.deferred = 0  # re-plans that were put off because of frame budget
+
+    def get_limit(self):
+        # max number of monsters that can re-plan during tick
+        if self.deterministic:
+            return AI_SESSION_BUDGET
+        if not self.cost:
+            return None
+        return max(1, int(self.budget / self.cost))
+
+    def measure(self, number, seconds):
+        # is called by steering after number of monsters have re-planned
+        if number:
+            cost = seconds / number
+            # moving average, so a single slow tick doesn't stop re-planning for a long time
+            self.cost = cost if not self.cost else self.cost * 0.9 + cost * 0.1
+
+    def select(self, monsters):
+        # returns for every monster whether it should re-plan during this tick
+        self.tick_number += 1
+        world = self.world
+        goal_x, goal_y = world.character.rect.center
+        state = goal_x, goal_y, world.navigation.version, world.flow_field.revision
+        needed = [i for i, monster in enumerate(monsters) if monster.plan_state != (monster.rect.center, state)]
+        skipped = len(monsters) - len(needed)
+        limit = self.get_limit()
+        if limit is not None and len(needed) > limit:
+            by_distance = sorted(needed, key=lambda i: hypot(monsters[i].rect.centerx - goal_x,
+                                                             monsters[i].rect.centery - goal_y))
+            nearest = int(limit * AI_NEAREST_SHARE)
+            # monsters that have been waiting for the longest time go first
+            waiting = sorted(by_distance[nearest:], key=lambda i: monsters[i].planned_at)
+            selected = by_distance[:nearest] + waiting[:limit - nearest]
+        else:
+            selected = needed
+        deferred = len(needed) - len(selected)
+        replan = [False] * len(monsters)
+        for i in selected:
+            replan[i] = True
+            monster = monsters[i]
+            monster.planned_at = self.tick_number
+            monster.plan_state = monster.rect.center, state
+        self.skipped += skipped
+        self.deferred += deferred
+        if PROFILER.enabled:
+            PROFILER.count('replans', len(selected))
+            PROFILER.count('skipped replans', skipped)
+            PROFILER.count('deferred replans', deferred)
+        return replan
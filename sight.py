@@ -0,0 +1,59 @@
+from helpers import to_px
+from constants import SIGHT_TOLERANCE, SIMULATION_RATE
+from profiler import PROFILER
+from world_objects import Character
+
+
+class LineOfSight:
+    # answers whether there are static objects on the line between monster and its goal.
+    # only objects registered in cells of spatial grid the line passes through are checked.
+    # number of objects on the line is kept in monster and reused while neither monster nor goal has moved
+    # farther than tolerance from where it was checked and static objects are the same
+    # (monsters and character move only a few px per tick, so the answer rarely changes)
+    def __init__(self, world):
+        self.world = world
+        self.tolerance = to_px(Character.speed) * SIGHT_TOLERANCE / SIMULATION_RATE  # px
+        self.hits = 0
+        self.misses = 0
+
+    def get_hit_rate(self):
+        checks = self.hits + self.misses
+        return self.hits / checks if checks else 0
+
+    def get_cached(self, monster, goal_x, goal_y):
+        # returns cached number of obstacles on the line or None if line should be checked again
+        sight = monster.sight
+        if sight is None:
+            return None
+        x, y = monster.rect.center
+        cached_x, cached_y, cached_goal_x, cached_goal_y, version, obstacles = sight
+        tolerance = self.tolerance
+        if (version != self.world.navigation.version or abs(x - cached_x) > tolerance
+                or abs(y - cached_y) > tolerance or abs(goal_x - cached_goal_x) > tolerance
+                or abs(goal_y - cached_goal_y) > tolerance):
+            return None
+        return obstacles
+
+    def store(self, monster, goal_x, goal_y, obstacles):
+        monster.sight = *monster.rect.center, goal_x, goal_y, self.world.navigation.version, obstacles
+
+    def count(self, hits, misses, obstacles):
+        # obstacles are static objects on lines of all monsters that were checked or taken from cache
+        self.hits += hits
+        self.misses += misses
+        if PROFILER.enabled:
+            PROFILER.count('sight hits', hits)
+            PROFILER.count('sight misses', misses)
+            PROFILER.count('obstacles', obstacles)
+
+    def is_blocked(self, monster, goal_x, goal_y):
+        obstacles = self.get_cached(monster, goal_x, goal_y)
+        if obstacles is not None:
+            self.count(1, 0, obstacles)
+            return obstacles > 0
+        x, y = monster.rect.center
+        obstacles = sum(1 for obj in self.world.static.query_line(goal_x, goal_y, x, y)
+                        if obj.rect.clipline(goal_x, goal_y, x, y))
+        self.count(0, 1, obstacles)
+        self.store(monster, goal_x, goal_y, obstacles)
+        return obstacles > 0
@@ -0,0 +1,165 @@
+import mmap
+import os
+import shutil
+import struct
+from zlib import crc32
+
+from world_objects import Stone, Tree, Monster, Character
+
+# binary format of saved world:
+# header (magic bytes, version, number of sections, seed of world, number of chunks),
+# chunks of map that are in memory (their objects are in this snapshot) and sections of objects.
+# section is a header (id of kind, number of objects) followed by packed params of objects of this kind.
+# records of one kind have the same size, so a whole section is decoded at once with struct.iter_unpack.
+# id of object is its position in snapshot
+MAGIC = b'SRVW'
+VERSION = 2
+HEADER = struct.Struct('<4sHHQI')
+CHUNK = struct.Struct('<ii')  # column, row
+SECTION = struct.Struct('<BI')
+KINDS = [Stone, Tree, Monster, Character]  # index of kind is its id in file, new kinds are added to the end
+RECORDS = {
+    Stone: struct.Struct('<iii'),  # x, y, size
+    Tree: struct.Struct('<iii'),  # x, y, size
+    Monster: struct.Struct('<ddiiid'),  # x, y, size, hp, max hp, speed
+    Character: struct.Struct('<ddiii'),  # x, y, size, hp, max hp
+}
+
+# delta is written next to snapshot and contains changes since the snapshot was written:
+# header (magic bytes, version, checksum of snapshot, number of removed objects, number of sections),
+# ids of removed objects and sections of changed objects (every record is prefixed with id of object).
+# objects that aren't in snapshot have NEW_ID instead of id.
+# delta is ignored if checksum doesn't match snapshot (e.g. if snapshot was written after delta)
+DELTA_MAGIC = b'SRVD'
+DELTA_HEADER = struct.Struct('<4sHIII')
+DELTA_SUFFIX = '.delta'
+CHUNKS_SUFFIX = '.chunks'  # directory with chunks of map that aren't in memory
+ID = struct.Struct('<I')
+NEW_ID = 0xFFFFFFFF
+
+
+def get_records(objects):
+    # params of objects by which they can be recreated
+    return [(obj.__class__, obj.get_params()) for obj in objects]
+
+
+def pack_sections(records, with_ids=False):
+    # consecutive records of the same kind are packed into one section
+    sections = []
+    for record in records:
+        if sections and sections[-1][0] is record[0]:
+            sections[-1][1].append(record)
+        else:
+            sections.append((record[0], [record]))
+    data = []
+    for kind, records_of_kind in sections:
+        data.append(SECTION.pack(KINDS.index(kind), len(records_of_kind)))
+        if with_ids:
+            record_struct = struct.Struct('<I' + RECORDS[kind].format[1:])
+            data.extend(record_struct.pack(obj_id, *params) for kind, params, obj_id in records_of_kind)
+        else:
+            data.extend(RECORDS[kind].pack(*params) for kind, params in records_of_kind)
+    return len(sections), b''.join(data)
+
+
+def unpack_sections(data, offset, number_of_sections, with_ids=False):
+    records = []
+    for _ in range(number_of_sections):
+        kind_id, number_of_records = SECTION.unpack_from(data, offset)
+        offset += SECTION.size
+        kind = KINDS[kind_id]
+        record_struct = struct.Struct('<I' + RECORDS[kind].format[1:]) if with_ids else RECORDS[kind]
+        end = offset + record_struct.size * number_of_records
+        if with_ids:
+            records.extend((kind, params[1:], params[0]) for params in record_struct.iter_unpack(data[offset:end]))
+        else:
+            records.extend((kind, params) for params in record_struct.iter_unpack(data[offset:end]))
+        offset = end
+    return records
+
+
+def pack_snapshot(records, seed=0, chunks=()):
+    number_of_sections, sections = pack_sections(records)
+    header = HEADER.pack(MAGIC, VERSION, number_of_sections, seed, len(chunks))
+    return header + b''.join(CHUNK.pack(*chunk) for chunk in chunks) + sections
+
+
+def pack_delta(checksum, removed, changed):
+    # removed is list of ids, changed is list of (kind, params, id)
+    number_of_sections, sections = pack_sections(changed, with_ids=True)
+    header = DELTA_HEADER.pack(DELTA_MAGIC, VERSION, checksum, len(removed), number_of_sections)
+    return header + b''.join(ID.pack(obj_id) for obj_id in removed) + sections
+
+
+def write_atomically(path, data):
+    # file is written next to the old one and then replaces it,
+    # so if game crashes while writing, the old file stays untouched
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+def write_snapshot(records, path, seed=0, chunks=()):
+    # returns checksum of written snapshot, deltas are written relative to it
+    data = pack_snapshot(records, seed, chunks)
+    write_atomically(path, data)
+    if os.path.exists(path + DELTA_SUFFIX):
+        os.remove(path + DELTA_SUFFIX)  # all changes are already in snapshot
+    return crc32(data)
+
+
+def write_delta(checksum, removed, changed, path):
+    write_atomically(path + DELTA_SUFFIX, pack_delta(checksum, removed, changed))
+
+
+def save_snapshot(objects, path, seed=0, chunks=()):
+    return write_snapshot(get_records(objects), path, seed, chunks)
+
+
+def read_snapshot(path):
+    # returns records of objects, checksum of file, seed of world and chunks in memory
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        magic, version, number_of_sections, seed, number_of_chunks = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a saved world or was saved by another version of the game')
+        offset = HEADER.size + CHUNK.size * number_of_chunks
+        chunks = list(CHUNK.iter_unpack(data[HEADER.size:offset]))
+        return unpack_sections(data, offset, number_of_sections), crc32(data), seed, chunks
+
+
+def apply_delta(records, checksum, path):
+    with open(path, 'rb') as file:
+        data = file.read()
+    magic, version, base_checksum, number_of_removed, number_of_sections = DELTA_HEADER.unpack_from(data)
+    if magic != DELTA_MAGIC or version != VERSION or base_checksum != checksum:
+        return records
+    offset = DELTA_HEADER.size
+    records = list(records)
+    for (obj_id,) in ID.iter_unpack(data[offset:offset + ID.size * number_of_removed]):
+        records[obj_id] = None
+    offset += ID.size * number_of_removed
+    for kind, params, obj_id in unpack_sections(data, offset, number_of_sections, with_ids=True):
+        if obj_id == NEW_ID:
+            records.append((kind, params))
+        else:
+            records[obj_id] = kind, params
+    return [record for record in records if record is not None]
+
+
+def load_snapshot(path):
+    # returns objects, seed of world and chunks in memory
+    records, checksum, seed, chunks = read_snapshot(path)
+    if os.path.exists(path + DELTA_SUFFIX):
+        records = apply_delta(records, checksum, path + DELTA_SUFFIX)
+    return [kind(*params) for kind, params in records], seed, chunks
+
+
+def delete_snapshot(path):
+    for file_path in [path, path + DELTA_SUFFIX]:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    if os.path.exists(path + CHUNKS_SUFFIX):
+        shutil.rmtree(path + CHUNKS_SUFFIX)
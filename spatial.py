@@ -0,0 +1,119 @@
+from pygame.sprite import Group
+from math import hypot
+
+from helpers import to_px
+from constants import GRID_CELL_SIZE
+
+
+class SpatialGrid(Group):
+    # group that additionally splits the map into square cells (uniform grid / spatial hash).
+    # every sprite is registered in all cells its rect overlaps,
+    # so to find objects near some point or within some area we only need to look through a few cells
+    # instead of checking every object on the map
+    def __init__(self, *sprites):
+        self.cell_size = to_px(GRID_CELL_SIZE)
+        self.cells = {}  # (column, row) -> sprites registered in this cell
+        # dicts are used instead of sets to keep order of sprites deterministic
+        self.sprite_cells = {}  # sprite -> (first column, first row, last column, last row)
+        super(SpatialGrid, self).__init__(*sprites)
+
+    def get_cells_range(self, rect):
+        # right and bottom borders of pygame.Rect are not included in rect
+        size = self.cell_size
+        return rect.left // size, rect.top // size, (rect.right - 1) // size, (rect.bottom - 1) // size
+
+    def add_internal(self, sprite, layer=None):
+        super(SpatialGrid, self).add_internal(sprite, layer)
+        self.register(sprite, self.get_cells_range(sprite.rect))
+        sprite.grid = self
+
+    def remove_internal(self, sprite):
+        super(SpatialGrid, self).remove_internal(sprite)
+        self.unregister(sprite)
+        sprite.grid = None
+
+    def register(self, sprite, cells_range):
+        first_column, first_row, last_column, last_row = cells_range
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                self.cells.setdefault((column, row), {})[sprite] = None
+        self.sprite_cells[sprite] = cells_range
+
+    def unregister(self, sprite):
+        first_column, first_row, last_column, last_row = self.sprite_cells.pop(sprite)
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                cell = self.cells[column, row]
+                del cell[sprite]
+                if not cell:
+                    del self.cells[column, row]
+
+    def relocate(self, sprite):
+        # is called every time rect of sprite changes.
+        # most of the time sprite stays within the same cells, so nothing has to be updated
+        cells_range = self.get_cells_range(sprite.rect)
+        if cells_range != self.sprite_cells[sprite]:
+            self.unregister(sprite)
+            self.register(sprite, cells_range)
+
+    def get_sprites_in_cells(self, cells_range):
+        first_column, first_row, last_column, last_row = cells_range
+        sprites = {}
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                cell = self.cells.get((column, row))
+                if cell:
+                    sprites.update(cell)
+        return sprites
+
+    def query_rect(self, rect):
+        # sprites whose rects collide given rect
+        candidates = self.get_sprites_in_cells(self.get_cells_range(rect))
+        return [sprite for sprite in candidates if rect.colliderect(sprite.rect)]
+
+    def query_point(self, x, y):
+        # sprites whose rects contain given point
+        cell = self.cells.get((x // self.cell_size, y // self.cell_size), {})
+        return [sprite for sprite in cell if sprite.rect.collidepoint(x, y)]
+
+    def query_line(self, x1, y1, x2, y2):
+        # sprites registered in cells the line passes through (their rects don't necessarily cross the line).
+        # cells are visited one by one from the start of line to its end (grid traversal)
+        size = self.cell_size
+        column, row = int(x1 // size), int(y1 // size)
+        last_column, last_row = int(x2 // size), int(y2 // size)
+        dx, dy = x2 - x1, y2 - y1
+        step_x, step_y = (1 if dx > 0 else -1), (1 if dy > 0 else -1)
+        # parts of the line from its start to the next vertical and horizontal borders of cells
+        # and length of a cell in parts of the line
+        next_x = ((column + (step_x > 0)) * size - x1) / dx if dx else float('inf')
+        next_y = ((row + (step_y > 0)) * size - y1) / dy if dy else float('inf')
+        delta_x = size / abs(dx) if dx else float('inf')
+        delta_y = size / abs(dy) if dy else float('inf')
+        sprites = {}
+        for _ in range(abs(last_column - column) + abs(last_row - row) + 1):
+            cell = self.cells.get((column, row))
+            if cell:
+                sprites.update(cell)
+            if next_x < next_y:
+                column += step_x
+                next_x += delta_x
+            else:
+                row += step_y
+                next_y += delta_y
+        return list(sprites)
+
+    def query_radius(self, x, y, radius):
+        # sprites whose rects intersect circle with given center and radius
+        size = self.cell_size
+        cells_range = (int((x - radius) // size), int((y - radius) // size),
+                       int((x + radius) // size), int((y + radius) // size))
+        sprites = []
+        for sprite in self.get_sprites_in_cells(cells_range):
+            rect = sprite.rect
+            # distance from center of circle to the closest point of rect
+            dx = max(rect.left - x, 0, x - rect.right)
+            dy = max(rect.top - y, 0, y - rect.bottom)
+            if hypot(dx, dy) <= radius:
+                sprites.append(sprite)
+        return sprites
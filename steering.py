@@ -0,0 +1,149 @@
+from time import perf_counter
+import numpy as np
+
+from constants import SIMULATION_RATE, BATCH_STEERING_MIN_MONSTERS
+from profiler import PROFILER
+
+
+def get_rects(objects):
+    return np.array([tuple(obj.rect) for obj in objects], dtype=np.int64).reshape(-1, 4)
+
+
+def count_crossed_rects(starts, ends, rects):
+    # for every line (start, end) counts rects it crosses (Liang-Barsky algorithm for all pairs at once).
+    if not len(rects):
+        return np.zeros(len(starts), dtype=int)
+    x0, y0 = starts[:, 0, None], starts[:, 1, None]
+    dx, dy = ends[:, 0, None] - x0, ends[:, 1, None] - y0
+    # pixels of line are rounded to the nearest ones, so line crosses rect if it passes within half of pixel from it
+    left, top = rects[:, 0] - 0.5, rects[:, 1] - 0.5
+    right, bottom = left + rects[:, 2], top + rects[:, 3]
+    enter = np.zeros((len(starts), len(rects)))
+    leave = np.ones((len(starts), len(rects)))
+    inside = np.ones((len(starts), len(rects)), dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for p, q in [(-dx, x0 - left), (dx, right - x0), (-dy, y0 - top), (dy, bottom - y0)]:
+            p, q = np.broadcast_arrays(p, q)
+            # line is parallel to border and lies outside of it
+            inside &= ~((p == 0) & (q < 0))
+            t = q / p
+            enter = np.where(p < 0, np.maximum(enter, t), enter)
+            leave = np.where(p > 0, np.minimum(leave, t), leave)
+    return (inside & (enter <= leave)).sum(axis=1)
+
+
+class BatchSteering:
+    # monsters on screen are steered in one pass over numpy arrays instead of one by one:
+    # directions to goal, which monsters can attack, obstacles on the way to goal and steps of monsters
+    # are calculated for all monsters at once. sprite methods with mask-accurate collision detection
+    # are called only for monsters that need them: monsters whose rect overlaps an obstacle after step,
+    # monsters whose image has to be rotated and monsters that attack
+    def __init__(self, world):
+        self.world = world
+
+    def tick(self, monsters, objects_to_check_collision, decisions, replan):
+        # decisions are directions around obstacles found by worker processes (monster -> direction or None),
+        # replan is whether every monster chooses its direction again (see scheduler.PlanningScheduler)
+        world = self.world
+        goal = world.character
+        if len(monsters) < BATCH_STEERING_MIN_MONSTERS:
+            # preparing arrays costs more than steering a few monsters one by one
+            for monster, monster_replans in zip(monsters, replan):
+                monster.remember_position()
+                if monster.rect.collidepoint(goal.rect.center):  # if monster is close enough to attack
+                    if monster.try_to_attack(goal):
+                        world.particles.emit(*goal.rect.center)
+                monster.try_to_move_towards(goal, objects_to_check_collision, world.map_rect, world.flow_field,
+                                            world.sight, decisions, monster_replans)
+            return
+        for monster in monsters:
+            monster.remember_position()
+        rects = get_rects(monsters)
+        goal_x, goal_y = goal.rect.center
+
+        # monster attacks if center of goal is within its rect
+        timers = np.array([monster.attack_timer for monster in monsters])
+        attack_speeds = np.array([monster.__class__.attack_speed for monster in monsters])
+        can_attack = ((rects[:, 0] <= goal_x) & (goal_x < rects[:, 0] + rects[:, 2])
+                      & (rects[:, 1] <= goal_y) & (goal_y < rects[:, 1] + rects[:, 3]) & (timers >= attack_speeds))
+        for i in np.flatnonzero(can_attack):
+            if monsters[i].try_to_attack(goal):
+                world.particles.emit(goal_x, goal_y)
+
+        # monsters turn to direction they moved in on the previous tick
+        # (masks are checked only if image of monster changes after rotation)
+        for monster in monsters:
+            direction = monster.speed_direction
+            if direction is not None and direction != monster.view_direction:
+                monster.try_to_rotate(direction, objects_to_check_collision, world.map_rect)
+        rects = get_rects(monsters)  # rotated monsters have other rects
+
+        # monsters that have obstacles between them and goal take direction around them from flow field
+        start = perf_counter()
+        centers = rects[:, :2] + rects[:, 2:] // 2
+        obstacles = get_rects(objects_to_check_collision)
+        undecided = [i for i, monster in enumerate(monsters) if replan[i] and monster not in decisions]
+        crossed = np.zeros(len(monsters), dtype=int)  # number of obstacles on the line of every monster
+        # lines of sight that are still valid are taken from cache, the rest of them are checked at once
+        sight = world.sight
+        unknown = []
+        for i in undecided:
+            cached = sight.get_cached(monsters[i], goal_x, goal_y)
+            if cached is None:
+                unknown.append(i)
+            else:
+                crossed[i] = cached
+        if unknown:
+            goals = np.broadcast_to(np.array([goal_x, goal_y]), (len(unknown), 2))
+            crossed[unknown] = count_crossed_rects(goals, centers[unknown], obstacles)
+            for i in unknown:
+                sight.store(monsters[i], goal_x, goal_y, int(crossed[i]))
+        sight.count(len(undecided) - len(unknown), len(unknown), int(crossed.sum()))
+        blocked = crossed > 0
+        if PROFILER.enabled:
+            PROFILER.count('blocked monsters', int(blocked.sum()))
+
+        # y axis of screen is directed down, but angles are measured with y axis directed up
+        dif_x, dif_y = goal_x - centers[:, 0], centers[:, 1] - goal_y
+        directions = np.degrees(np.arctan2(dif_y, dif_x)) % 360
+        for i, monster in enumerate(monsters):
+            if not replan[i]:
+                # monster keeps moving in direction it has chosen before
+                directions[i] = 0 if monster.speed_direction is None else monster.speed_direction
+                continue
+            bypassing_direction = decisions.get(monster)
+            if blocked[i]:
+                bypassing_direction = world.flow_field.get_direction(*centers[i])
+            if bypassing_direction is not None:
+                directions[i] = bypassing_direction
+                monster.speed_direction = bypassing_direction
+            else:
+                # monster is already at goal if distance to it is 0
+                monster.speed_direction = None if dif_x[i] == 0 and dif_y[i] == 0 else float(directions[i])
+        world.planning.measure(sum(replan), perf_counter() - start)
+
+        # step straight to speed direction. if rect of monster doesn't overlap any obstacle after step
+        # and monster stays within map, it can't collide anything, so masks aren't checked
+        speeds = np.array([monster.speed for monster in monsters]) / SIMULATION_RATE
+        steps = np.stack([np.cos(np.radians(directions)), -np.sin(np.radians(directions))], axis=1) * speeds[:, None]
+        coords = np.array([monster.actual_coords for monster in monsters]) + steps
+        lefts, tops = coords[:, 0].astype(np.int64), coords[:, 1].astype(np.int64)
+        rights, bottoms = lefts + rects[:, 2], tops + rects[:, 3]
+        map_rect = world.map_rect
+        within_map = (lefts >= map_rect.left) & (tops >= map_rect.top) & \
+                     (rights <= map_rect.right) & (bottoms <= map_rect.bottom)
+        if len(obstacles):
+            overlaps = ((lefts[:, None] < obstacles[:, 0] + obstacles[:, 2]) & (obstacles[:, 0] < rights[:, None])
+                        & (tops[:, None] < obstacles[:, 1] + obstacles[:, 3]) & (obstacles[:, 1] < bottoms[:, None]))
+            free = within_map & ~overlaps.any(axis=1)
+        else:
+            free = within_map
+        for i, monster in enumerate(monsters):
+            if monster.speed_direction is None:
+                continue
+            if free[i]:
+                monster.move(*steps[i])
+            else:
+                monster.try_to_move(objects_to_check_collision, map_rect)
+        if PROFILER.enabled:
+            PROFILER.count('masked moves', int((~free).sum()))
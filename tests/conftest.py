@@ -0,0 +1,13 @@
+import os
+import sys
+import pygame
+
+# tests are run without window, but images of objects are converted to display format when they are loaded,
+# so a display should exist before modules of game are imported
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from constants import SCREEN_SIZE
+
+pygame.init()
+pygame.display.set_mode(SCREEN_SIZE)
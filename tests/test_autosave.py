@@ -0,0 +1,25 @@
+from content import World
+from world_objects import Monster
+from snapshot import load_snapshot
+
+
+def get_params(objects):
+    return [(obj.__class__.__name__, obj.get_params()) for obj in objects]
+
+
+def test_autosave_delta_round_trip(tmp_path):
+    # world loaded from snapshot and delta written by autosave is the same as world in memory
+    world = World(None, str(tmp_path / 'world.sav'), deterministic=True, worker_processes=False)
+    world.generate(7)
+    autosave = world.autosave
+    autosave.save_snapshot()
+    autosave.checksum = autosave.future.result()
+    monsters = list(world.monsters)
+    world.remove(monsters[0])
+    x, y = monsters[1].actual_coords
+    monsters[1].actual_coords = x + 5.5, y - 3
+    world.add(Monster(*monsters[2].get_params()))
+    autosave.save_delta()
+    world.close()
+    objects = load_snapshot(world.save_path)[0]
+    assert sorted(get_params(objects)) == sorted(get_params(world.objects))
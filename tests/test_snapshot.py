@@ -0,0 +1,41 @@
+from world_objects import Stone, Tree, Monster, Character
+from snapshot import write_snapshot, write_delta, read_snapshot, load_snapshot, get_records, NEW_ID
+
+RECORDS = [
+    (Stone, (10, 20, 30)),
+    (Stone, (40, 50, 60)),
+    (Tree, (70, 80, 90)),
+    (Monster, (100.5, 200.25, 50, 30, 40, 2.5)),
+    (Monster, (300.0, 400.0, 60, 50, 50, 1.5)),
+    (Character, (500.0, 600.0, 70, 80, 100)),
+]
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'world.sav')
+    checksum = write_snapshot(RECORDS, path, 123, [(1, 2), (3, 4)])
+    records, read_checksum, seed, chunks = read_snapshot(path)
+    assert records == RECORDS
+    assert (read_checksum, seed, chunks) == (checksum, 123, [(1, 2), (3, 4)])
+    objects, seed, chunks = load_snapshot(path)
+    assert get_records(objects) == RECORDS
+
+
+def test_delta_round_trip(tmp_path):
+    # ids of delta are positions of objects in snapshot, so removing an object shifts the rest of them
+    path = str(tmp_path / 'world.sav')
+    checksum = write_snapshot(RECORDS, path)
+    moved = (Monster, (110.5, 190.25, 50, 20, 40, 2.5))
+    new = (Monster, (700.0, 800.0, 40, 10, 10, 3.0))
+    write_delta(checksum, [1], [(*moved, 3), (*new, NEW_ID)], path)
+    objects = load_snapshot(path)[0]
+    assert get_records(objects) == [RECORDS[0], RECORDS[2], moved, RECORDS[4], RECORDS[5], new]
+
+
+def test_stale_delta_is_ignored(tmp_path):
+    # delta was written against snapshot that has been replaced since then
+    path = str(tmp_path / 'world.sav')
+    checksum = write_snapshot(RECORDS, path)
+    write_snapshot(RECORDS[:4], path)
+    write_delta(checksum, [0], [(Monster, (1.0, 2.0, 50, 30, 40, 2.5), NEW_ID)], path)
+    assert get_records(load_snapshot(path)[0]) == RECORDS[:4]
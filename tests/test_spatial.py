@@ -0,0 +1,63 @@
+from math import hypot
+from random import Random
+from pygame import Rect
+from pygame.sprite import Sprite
+
+from spatial import SpatialGrid
+from world_objects import Stone
+
+
+class Box(Sprite):
+    def __init__(self, rect):
+        super(Box, self).__init__()
+        self.rect = rect
+
+
+def get_random_grid(rng):
+    return SpatialGrid(*[Box(Rect(rng.randint(-500, 3000), rng.randint(-500, 3000),
+                                  rng.randint(1, 300), rng.randint(1, 300))) for _ in range(300)])
+
+
+def test_queries_match_brute_force():
+    rng = Random(2)
+    grid = get_random_grid(rng)
+    for _ in range(500):
+        rect = Rect(rng.randint(-600, 3100), rng.randint(-600, 3100), rng.randint(1, 800), rng.randint(1, 800))
+        assert set(grid.query_rect(rect)) == {sprite for sprite in grid if rect.colliderect(sprite.rect)}
+        x, y = rng.randint(-600, 3100), rng.randint(-600, 3100)
+        assert set(grid.query_point(x, y)) == {sprite for sprite in grid if sprite.rect.collidepoint(x, y)}
+        radius = rng.randint(0, 500)
+        inside = {sprite for sprite in grid
+                  if hypot(x - min(max(x, sprite.rect.left), sprite.rect.right),
+                           y - min(max(y, sprite.rect.top), sprite.rect.bottom)) <= radius}
+        assert set(grid.query_radius(x, y, radius)) == inside
+
+
+def test_moved_object_is_found_at_new_position():
+    grid = SpatialGrid()
+    stone = Stone(100, 100, 50)
+    grid.add(stone)
+    stone.move(2000, 1500)
+    assert grid.query_point(2120, 1620) == [stone]
+    assert grid.query_rect(Rect(100, 100, 50, 50)) == []
+    assert grid.query_radius(125, 125, 10) == []
+    # sprite is registered only in cells its rect overlaps now
+    assert grid.sprite_cells[stone] == grid.get_cells_range(stone.rect)
+    assert all(stone in cell for cell in grid.cells.values())
+    grid.remove(stone)
+    assert grid.cells == {} and stone.grid is None
+
+
+def test_query_line_finds_every_crossed_sprite():
+    # query_line may return extra sprites, but it should never miss sprites whose rects cross the line
+    rng = Random(1)
+    grid = get_random_grid(rng)
+    for _ in range(2000):
+        x1, y1 = rng.randint(-600, 3100), rng.randint(-600, 3100)
+        x2, y2 = x1 + rng.randint(-1500, 1500), y1 + rng.randint(-1500, 1500)
+        if rng.random() < 0.1:
+            x2 = x1
+        if rng.random() < 0.1:
+            y2 = y1
+        crossed = {sprite for sprite in grid if sprite.rect.clipline(x1, y1, x2, y2)}
+        assert crossed <= set(grid.query_line(x1, y1, x2, y2))
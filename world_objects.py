@@ -1,19 +1,20 @@
-from pygame.sprite import Sprite, spritecollideany, collide_mask, spritecollide, collide_rect, Group
+from pygame.sprite import Sprite
 from pygame import Rect, Surface
-from pygame.mask import from_surface, Mask
+from pygame.mask import from_surface
 
 from helpers import *
 from constants import *
-from math import hypot, sin, cos, radians, degrees, atan
-from random import randint
-from functools import reduce
-
-SCREEN = pygame.display.set_mode(SCREEN_SIZE)
+from assets import ROTATIONS, SCALED_IMAGES
+from profiler import PROFILER
+from collision import SHAPES, collides_any, get_colliding, mask_within_rect
+from generation import Placement, get_rect
+from math import hypot, sin, cos, radians, degrees, atan, atan2
+import random
 
 
 class WorldObject(Sprite):
     # image is loaded and mask is calculated in advance for each type of objects
-    # and then resized for each individual object
+    # and then resized for each size of objects (objects of the same kind and size share their image and mask)
     # it significantly accelerates the process of loading a world and collision detection
     image = Surface((100, 100))
     mask = from_surface(image)
@@ -22,17 +23,27 @@ class WorldObject(Sprite):
     # this way we can easily change game params and don't have to work with large numbers
     # as it would be if params were measured in px
     size_range = (0.5, 2)
-    number_of_objects = 1
+    number_of_objects = 1  # number of objects of this kind in every chunk of map
+    grid = None  # spatial grid object is registered in (is set by grid itself)
 
     def __init__(self, x, y, size):
         super(WorldObject, self).__init__()
         size = (size, size)  # width of every image of object is equal to its height
         self.rect = Rect(x, y, *size)
-        self.image = pygame.transform.scale(self.__class__.image, size)
-        self.mask = self.__class__.mask.scale(size)
+        self.image, self.mask = self.get_scaled(size)
+
+    @classmethod
+    def get_scaled(cls, size):
+        return SCALED_IMAGES.get(cls.__name__, cls.image, cls.mask, size)
 
     def move(self, x_offset, y_offset):
-        self.rect = Rect(self.rect.x + x_offset, self.rect.y + y_offset, self.rect.w, self.rect.h)
+        self.rect.move_ip(x_offset, y_offset)
+        self.relocate()
+
+    def relocate(self):
+        # should be called every time rect of object changes so spatial grid stays up to date
+        if self.grid is not None:
+            self.grid.relocate(self)
 
     def w(self):
         return self.rect[-2]
@@ -51,38 +62,54 @@ class WorldObject(Sprite):
 
     def current_coords_are_correct(self, objects_to_check_collision, map_rect):
         # check if object is within map and doesn't collide other objects
-        collides = spritecollideany(self, objects_to_check_collision, collide_mask)
-        return self.within_rect(map_rect) and not collides
+        if PROFILER.enabled:
+            PROFILER.count('collision checks', len(objects_to_check_collision))
+        return self.within_rect(map_rect) and not collides_any(self, objects_to_check_collision)
 
     def within_rect(self, rect):
         return rect.contains(self.rect)
 
+    def get_radius(self):
+        # radius of circle around center of object that contains its mask (is used to reject collisions quickly)
+        return SHAPES.get_radius(self, self.rect.w)
+
     @classmethod
-    def get_random_objects(cls, map_rect, objects_to_check_collision=Group()):
-        return Group(
-            *[cls.get_random_object(map_rect, objects_to_check_collision) for _ in range(cls.number_of_objects)])
+    def get_source_masks(cls):
+        # not scaled masks of all images object of this kind can have
+        return [cls.mask]
+
+    def get_drawing_rect(self, alpha):
+        # static objects are always drawn where they are
+        return self.rect
 
     @classmethod
-    def get_random_object(cls, map_rect, objects_to_check_collision=Group()):
-        obj = cls(*cls.get_random_initial_params())
-        if obj.current_coords_are_correct(objects_to_check_collision, map_rect):
-            return obj
-        # is called recursively until object has correct params
-        return cls.get_random_object(map_rect, objects_to_check_collision)
+    def get_random_object(cls, area, objects_to_check_collision=(), rng=random):
+        # area is rect object should be placed in, rng is source of random numbers
+        # (chunks of map use their own rng, so the same chunk always has the same objects).
+        # random params are generated until rect of object doesn't overlap other objects,
+        # sprite is built only for params that fit
+        placement = Placement(obj.rect for obj in objects_to_check_collision)
+        while True:
+            params = cls.get_random_initial_params(area, rng)
+            if placement.fits(get_rect(params)):
+                return cls(*params)
 
     @classmethod
-    def get_random_initial_params(cls):
+    def get_random_initial_params(cls, area, rng=random):
         min_size, max_size = cls.size_range
-        size = randint(to_px(min_size), to_px(max_size))
-        # object should be fully within map, so we need to subtract size of object from map borders
-        x, y = randint(0, to_px(MAP_SIZE[0]) - size), randint(0, to_px(MAP_SIZE[1]) - size)
+        size = rng.randint(to_px(min_size), to_px(max_size))
+        # object should be fully within area, so we need to subtract size of object from area borders
+        x, y = rng.randint(area.x, area.right - size), rng.randint(area.y, area.bottom - size)
         return x, y, size
 
-    def __repr__(self):
+    def get_params(self):
         # method is used when world is saved
         # by these params object can be recreated
         # so when user continues last game object has same properties
-        return f'{self.__class__.__name__} {self.x()} {self.y()} {self.w()}'
+        return self.x(), self.y(), self.w()
+
+    def __repr__(self):
+        return ' '.join(map(str, [self.__class__.__name__, *self.get_params()]))
 
 
 class Mob(WorldObject):
@@ -91,6 +118,9 @@ class Mob(WorldObject):
     damage = 0
     attack_speed = 1  # seconds
     max_hp = 0
+    number_of_frames = 1  # mobs without animation always show the same frame
+    cur_frame = 0  # number of animation frame, mobs without animation always have the same frame
+    simulated_at = 0  # time of the last update in ms since world was loaded
 
     def __init__(self, x, y, size, hp, max_hp):
         super(Mob, self).__init__(x, y, size)
@@ -106,27 +136,34 @@ class Mob(WorldObject):
         self.attack_timer = 0  # increases every tick
         # mob can attack only if attack timer is equal or greater than its attack speed
         self.speed = 1  # length of mob speed vector when it's moving
-        self.actual_coords = self.coords()
+        self.actual_coords = x, y
         # if speed of mob is too low then it can move a very short distance every tick (less than 1 px)
         # in that case we should store float coordinates of mob (pygame.Rect can't work with float numbers)
         # otherwise mob won't move at all
-
-    def __repr__(self):
-        x = self.rect.centerx - self.initial_image.get_rect().centerx
-        y = self.rect.centery - self.initial_image.get_rect().centery
-        size = self.initial_image.get_size()[0]
+        self.previous_center = None  # center of mob before the last simulation step
+
+    def get_params(self):
+        # rotated image is bigger than initial one,
+        # so coordinates of not rotated mob with the same center are stored
+        size = self.initial_image.get_width()
+        x = self.actual_coords[0] + (self.rect.w - size) / 2
+        y = self.actual_coords[1] + (self.rect.h - size) / 2
         # to recreate a mob we also need to store its hp_level when user quits the game
-        return f'{self.__class__.__name__} {x} {y} {size} {self.hp_level.hp} {self.hp_level.max_hp}'
+        return x, y, size, self.hp_level.hp, self.hp_level.max_hp
 
     def try_to_rotate(self, new_angle, objects_to_check_collision, map_rect):
+        if ROTATIONS.get_bucket(new_angle) == ROTATIONS.get_bucket(self.view_direction):
+            # image of mob doesn't change, so mob can't collide anything after rotation
+            self.view_direction = new_angle
+            return True
+        if PROFILER.enabled:
+            PROFILER.count('rotations')
         old_params = self.image, self.mask, self.view_direction, self.rect, self.actual_coords
         old_x_center, old_y_center = self.rect.center
         # if after rotation mob collides objects, we need to set its params back
 
-        # all default images of mobs are drawn so direction of their sight is 90 degrees
-        # therefore to get angle by which initial image should be rotated
-        # we need to subtract 90 from sight direction of mob:
-        self.image = pygame.transform.rotate(self.initial_image, new_angle - 90)
+        # rotated images and masks are shared between all mobs of the same kind and size
+        self.image, self.mask = self.get_rotated(new_angle)
         # pygame.transform.rotate changes size of the image,
         # so we need to change size of rect attribute after rotation as well:
         self.rect = Rect(self.x(), self.y(), *self.image.get_size())
@@ -135,35 +172,105 @@ class Mob(WorldObject):
         new_x_center, new_y_center = self.rect.center
         x_dif, y_dif = old_x_center - new_x_center, old_y_center - new_y_center
         self.move(x_dif, y_dif)
-        self.mask = pygame.mask.from_surface(self.image)
         self.view_direction = new_angle
         if not self.current_coords_are_correct(objects_to_check_collision, map_rect):
             self.image, self.mask, self.view_direction, self.rect, self.actual_coords = old_params
+            self.relocate()
             return False
         return True
 
+    def get_radius(self):
+        # rect of mob changes after rotation, but its not rotated image doesn't
+        return SHAPES.get_radius(self, self.initial_image.get_width())
+
+    def get_rotated(self, angle):
+        # all default images of mobs are drawn so direction of their sight is 90 degrees
+        # therefore rotation cache rotates initial image by angle minus 90 degrees.
+        # number of frame grows past the last frame while the last frame of attack is held,
+        # but image stays the same, so it's cached as the last frame
+        frame = min(self.cur_frame, self.number_of_frames - 1)
+        return ROTATIONS.get(self.__class__.__name__, self.initial_image, frame, angle)
+
+    def warm_up_rotations(self):
+        ROTATIONS.warm_up(self.__class__.__name__, self.initial_image, self.cur_frame)
+
     def try_to_move(self, objects_to_check_collision, map_rect):
-        if self.speed_direction is not None:  # if mob is moving
-
-            # if mob can't move exactly towards its speed direction,
-            # its speed reflects from objects it collides with.
-            # this way mob doesn't get stuck in other objects when it can't move through them.
-            # difference between reflected speed direction and original speed direction
-            # should be less than right angle
-            # otherwise object bounces off other objects as a ball
-            for offset in range(91):
-                for angle in [self.speed_direction + offset, self.speed_direction - offset]:
-                    dif_x = cos(radians(angle)) * self.speed / FPS
-                    dif_y = -sin(radians(angle)) * self.speed / FPS
-                    self.move(dif_x, dif_y)
-                    if self.current_coords_are_correct(objects_to_check_collision, map_rect):
-                        return True
-                    self.move(-dif_x, -dif_y)
+        if self.speed_direction is None:  # mob isn't moving
+            return False
+
+        dif_x, dif_y = self.get_step(self.speed_direction)
+        self.move(dif_x, dif_y)
+        contacts = self.get_contact_directions(objects_to_check_collision, map_rect)
+        if not contacts:
+            return True
+        self.move(-dif_x, -dif_y)
+
+        # if mob can't move exactly towards its speed direction, it slides along objects it collides with.
+        # this way mob doesn't get stuck in other objects when it can't move through them.
+        # contact normal is calculated once from the areas where mob overlaps obstacles
+        # and mob moves perpendicular to it (or slightly away from obstacles if that doesn't help)
+        normal_x = sum(cos(radians(direction)) for direction in contacts)
+        normal_y = sum(sin(radians(direction)) for direction in contacts)
+        if abs(normal_x) < 1e-6 and abs(normal_y) < 1e-6:
+            return False  # mob is squeezed between obstacles from opposite sides
+        normal = degrees(atan2(normal_y, normal_x))
+
+        deflections = set()
+        for offset in [90, 70, 45]:
+            for angle in [normal + offset, normal - offset]:
+                # difference between sliding direction and original speed direction
+                # should not be greater than right angle
+                # otherwise object bounces off other objects as a ball
+                deflection = (angle - self.speed_direction + 180) % 360 - 180
+                deflections.add(max(-90, min(90, deflection)))
+        # the smallest deflections are tried first, counterclockwise ones go first if deflections are equal
+        for deflection in sorted(deflections, key=lambda deflection: (abs(deflection), -deflection)):
+            angle = self.speed_direction + deflection
+            dif_x, dif_y = self.get_step(angle)
+            self.move(dif_x, dif_y)
+            if self.current_coords_are_correct(objects_to_check_collision, map_rect):
+                return True
+            self.move(-dif_x, -dif_y)
         return False
 
+    def get_step(self, angle):
+        # offset of mob after one simulation step of moving in given direction
+        distance = self.speed / SIMULATION_RATE
+        return cos(radians(angle)) * distance, -sin(radians(angle)) * distance
+
+    def get_contact_directions(self, objects_to_check_collision, map_rect):
+        # directions in which objects that mob collides push it away.
+        # for every obstacle it's the direction in which overlapping area decreases the most
+        # (gradient of overlapping area is calculated by shifting mask of obstacle by 1 px)
+        directions = []
+        for obj in get_colliding(self, objects_to_check_collision):
+            x, y = obj.x() - self.x(), obj.y() - self.y()
+            area = self.mask.overlap_area
+            gradient_x = area(obj.mask, (x + 1, y)) - area(obj.mask, (x - 1, y))
+            gradient_y = area(obj.mask, (x, y + 1)) - area(obj.mask, (x, y - 1))
+            if gradient_x or gradient_y:
+                # y axis of screen is directed down, but angles are measured with y axis directed up
+                directions.append(degrees(atan2(-gradient_y, gradient_x)) % 360)
+            else:
+                # overlapping area doesn't change, so obstacle pushes mob back
+                directions.append((self.speed_direction + 180) % 360)
+        if not self.within_rect(map_rect):
+            # borders of map push mob back inside the map
+            if self.rect.left < map_rect.left:
+                directions.append(0)
+            if self.rect.right > map_rect.right:
+                directions.append(180)
+            if self.rect.top < map_rect.top:
+                directions.append(270)
+            if self.rect.bottom > map_rect.bottom:
+                directions.append(90)
+        return directions
+
     def move(self, x_offset, y_offset):
         self.actual_coords = self.actual_coords[0] + x_offset, self.actual_coords[1] + y_offset
-        self.rect = Rect(int(self.actual_coords[0]), int(self.actual_coords[1]), self.rect.w, self.rect.h)
+        # rect is changed in place, so no new Rect is created every time mob moves
+        self.rect.topleft = int(self.actual_coords[0]), int(self.actual_coords[1])
+        self.relocate()
 
     def try_to_attack(self, obj):
         if self.attack_timer >= self.__class__.attack_speed:
@@ -177,11 +284,21 @@ class Mob(WorldObject):
     def update(self, ticks):
         self.attack_timer += ticks / 1000
 
-    def draw_hp(self, surface):
-        im = self.hp_level.image
-        x = self.rect.centerx - im.get_rect().centerx
-        y = self.y() - im.get_rect().h - 3
-        surface.blit(im, (x, y))
+    def remember_position(self):
+        # is called before mob moves in simulation step
+        self.previous_center = self.actual_coords[0] + self.rect.w / 2, self.actual_coords[1] + self.rect.h / 2
+
+    def get_drawing_rect(self, alpha):
+        # frames are rendered between simulation steps.
+        # alpha is part of step that has passed since the last step,
+        # so mob is drawn between its previous and current positions and its movement looks smooth
+        if self.previous_center is None or alpha >= 1:
+            return self.rect
+        w, h = self.rect.size
+        previous_x, previous_y = self.previous_center
+        x = previous_x + (self.actual_coords[0] + w / 2 - previous_x) * alpha - w / 2
+        y = previous_y + (self.actual_coords[1] + h / 2 - previous_y) * alpha - h / 2
+        return Rect(int(x), int(y), w, h)
 
     def get_direction_to(self, x, y):
         x_dif, y_dif = x - self.rect.centerx, self.rect.centery - y
@@ -206,21 +323,21 @@ class Mob(WorldObject):
 class Stone(WorldObject):
     image = load_image('stone')
     mask = from_surface(image)
-    number_of_objects = 35
+    number_of_objects = 4
     size_range = (2, 4)
 
 
 class Tree(WorldObject):
     image = load_image('tree')
     mask = from_surface(image)
-    number_of_objects = 50
+    number_of_objects = 6
     size_range = (3, 5)
 
 
 class Monster(Mob):
     image = load_image('monster')
     mask = from_surface(image)
-    number_of_objects = 20
+    number_of_objects = 2
     size_range = 0.5, 4
     hp_range = 2, 20
     speed_range = 0.5, 1
@@ -231,14 +348,18 @@ class Monster(Mob):
     def __init__(self, x, y, size, hp, max_hp, speed):
         super(Monster, self).__init__(x, y, size, hp, max_hp)
         self.speed = speed
-        self.attack_timer = randint(0, self.__class__.attack_speed)
+        # number of tick monster on screen has chosen its direction in and state of world it was chosen in
+        # (see scheduler.PlanningScheduler)
+        self.planned_at = 0
+        self.plan_state = None
+        self.sight = None  # the last line of sight to goal (see sight.LineOfSight)
 
     @classmethod
-    def get_random_initial_params(cls):
+    def get_random_initial_params(cls, area, rng=random):
         # speed and hp of monster depend on its size.
         # if mob is big, it has high hp level but low speed
         # if mob is small, it has low hp level but high speed
-        x, y, size = super(Monster, cls).get_random_initial_params()
+        x, y, size = super(Monster, cls).get_random_initial_params(area, rng)
         min_size, max_size = cls.size_range
         k = (to_units(size) - min_size) / (max_size - min_size)
         min_hp, max_hp = cls.hp_range
@@ -247,82 +368,54 @@ class Monster(Mob):
         speed = to_px((1 - k) * (max_speed - min_speed) + min_speed)
         return x, y, size, max_hp, max_hp, speed
 
-    def __repr__(self):
-        rep = super(Monster, self).__repr__()
-        return f'{rep} {self.speed}'
+    def get_params(self):
+        return *super(Monster, self).get_params(), self.speed
 
-    def try_to_move_towards(self, goal, objects_to_check_collision, map_rect):
+    def try_to_move_towards(self, goal, objects_to_check_collision, map_rect, flow_field, sight, decisions=None,
+                            replan=True):
+        # decisions are directions around obstacles that were already found by worker processes
+        # (monster -> direction or None), if there is no decision for monster, it's made right here.
+        # if monster doesn't replan, it keeps moving in direction it has chosen before.
+        # if there are a lot of monsters on screen, steering.BatchSteering does the same for all of them at once
         if self.speed_direction is not None and self.speed_direction != self.view_direction:
             self.try_to_rotate(self.speed_direction, objects_to_check_collision, map_rect)
 
-        self_to_goal_line = *goal.rect.center, *self.rect.center
-        obstacles = list(filter(lambda obj: obj.rect.clipline(*self_to_goal_line), objects_to_check_collision))
-        # obstacles are objects that monster will collide if it moves straight towards goal
+        if not replan:
+            return super(Monster, self).try_to_move(objects_to_check_collision, map_rect)
+        if decisions is not None and self in decisions:
+            bypassing_direction = decisions[self]
+        else:
+            bypassing_direction = self.get_bypassing_direction(goal, sight, flow_field)
 
         self.speed_direction = self.get_direction_to(*goal.rect.center)
-        if obstacles:
-            # monster should bypass obstacles
-            self.speed_direction = self.get_bypassing_direction(self.speed_direction, obstacles)
+        if bypassing_direction is not None:
+            self.speed_direction = bypassing_direction
 
         return super(Monster, self).try_to_move(objects_to_check_collision, map_rect)
 
-    def get_bypassing_direction(self, direction_to_goal, obstacles):
-        masks_and_rects = map(lambda obj: (obj.mask, obj.rect), obstacles)
-
-        def get_union_mask_and_rect(mask_and_rect1, mask_and_rect2):
-            mask1, rect1 = mask_and_rect1
-            mask2, rect2 = mask_and_rect2
-            max_x = max(rect1.right, rect2.right)
-            max_y = max(rect1.bottom, rect2.bottom)
-            min_x = min(rect1.x, rect2.x)
-            min_y = min(rect1.y, rect2.y)
-            size = max_x - min_x, max_y - min_y
-            mask = Mask(size)
-            mask.draw(mask1, (rect1.x - min_x, rect1.y - min_y))
-            mask.draw(mask2, (rect2.x - min_x, rect2.y - min_y))
-            return mask, Rect(min_x, min_y, *size)
-
-        # create single mask from all obstacles.
-        # (finding bypassing direction is a lot faster using common mask than individual mask for each obstacle)
-        union_mask, mask_rect = reduce(get_union_mask_and_rect, masks_and_rects)
-        self_rect = self.initial_image.get_rect()
-        margin = hypot(self_rect.w, self_rect.h)
-        size = mask_rect.w + margin, mask_rect.h + margin
-        mask_with_margin = union_mask.scale(size)
-        old_rect = union_mask.get_rect()
-        new_rect = mask_with_margin.get_rect()
-        mask_x = mask_rect.x + old_rect.centerx - new_rect.centerx
-        mask_y = mask_rect.y + old_rect.centery - new_rect.centery
-
-        outline = mask_with_margin.outline()
-
-        opposite = direction_to_goal - 180 if direction_to_goal >= 180 else direction_to_goal + 180
-        min_border = min(opposite, direction_to_goal)
-        max_border = max(opposite, direction_to_goal)
-
-        angle1 = direction_to_goal
-        angle1_offset = 0
-        angle2 = direction_to_goal
-        angle2_offset = 0
-        for point in outline:
-            x, y = point
-            x, y = x + mask_x, y + mask_y
-            if not self.rect.collidepoint(x, y):
-                direction = self.get_direction_to(x, y)
-                offset = get_angle_between(direction, direction_to_goal)
-                if min_border < direction < max_border:
-                    if angle1_offset < offset:
-                        angle1 = direction
-                        angle1_offset = get_angle_between(angle1, direction_to_goal)
-                else:
-                    if angle2_offset < offset:
-                        angle2 = direction
-                        angle2_offset = get_angle_between(angle2, direction_to_goal)
-        return angle1 if angle1_offset < angle2_offset else angle2
+    def get_bypassing_direction(self, goal, sight, flow_field):
+        # returns None if monster can move straight towards goal.
+        # sight tells whether there are static objects monster will collide if it moves straight towards goal
+        if sight.is_blocked(self, *goal.rect.center):
+            # monster should bypass obstacles.
+            # path around them is taken from flow field that is shared by all monsters chasing the goal
+            return flow_field.get_direction(*self.rect.center)
+
+    def try_to_advance(self, direction, ticks, static_objects, map_rect):
+        # cheap movement for monsters that aren't visible: monster moves several ticks at once
+        # without rotation and sliding along obstacles. only objects next to it are checked for collision
+        distance = self.speed * ticks / 1000
+        dif_x, dif_y = cos(radians(direction)) * distance, -sin(radians(direction)) * distance
+        self.move(dif_x, dif_y)
+        if self.current_coords_are_correct(static_objects.query_rect(self.rect), map_rect):
+            self.speed_direction = direction
+            return True
+        self.move(-dif_x, -dif_y)
+        return False
 
 
 class Character(Mob):
-    image = load_image('character')
+    image = load_image('character')  # sprite sheet with all frames of animation
     mask = from_surface(image)
     size_range = (2, 2)
     action_radius = 3
@@ -331,6 +424,7 @@ class Character(Mob):
     damage = 1
     speed = 2
     number_of_objects = 1
+    number_of_frames = 9
 
     def __init__(self, x, y, size, hp, max_hp):
         super(Character, self).__init__(x, y, size, hp, max_hp)
@@ -338,17 +432,22 @@ class Character(Mob):
         # user can control speed direction of character using W, A, S, D
         # these keys correspond to top (90), left (180), bottom (270), right (0) directions
         self.speed = to_px(self.__class__.speed)
-        self.number_of_frames = 9
-        animation = pygame.transform.scale(self.__class__.image, (size * self.number_of_frames, size))
-        self.frames = self.get_frames(animation)
+        self.frames = self.get_frames(self.image)
+        self.cur_frame = None  # image isn't set yet
         self.set_frame(0)
         self.rect = Rect(x, y, *self.image.get_size())
-        self.actual_coords = self.coords()
+        self.actual_coords = x, y
         self.attacking = False
 
     @classmethod
-    def get_random_initial_params(cls):
-        params = super(Character, cls).get_random_initial_params()
+    def get_scaled(cls, size):
+        # the whole sprite sheet is scaled, its mask isn't needed (masks of frames are calculated when rotated)
+        w, h = size
+        return SCALED_IMAGES.get(cls.__name__, cls.image, None, (w * cls.number_of_frames, h))
+
+    @classmethod
+    def get_random_initial_params(cls, area, rng=random):
+        params = super(Character, cls).get_random_initial_params(area, rng)
         return *params, cls.max_hp, cls.max_hp
 
     def get_frames(self, sheet):
@@ -360,10 +459,16 @@ class Character(Mob):
         return frames
 
     def set_frame(self, i):
+        if i == self.cur_frame:
+            # character is standing still most of the time, so its image usually doesn't change
+            return
         self.cur_frame = i
         self.initial_image = self.frames[i]
-        self.image = pygame.transform.rotate(self.initial_image, self.view_direction - 90)
-        self.mask = from_surface(self.image)
+        self.image, self.mask = self.get_rotated(self.view_direction)
+
+    def warm_up_rotations(self):
+        for i, frame in enumerate(self.frames):
+            ROTATIONS.warm_up(self.__class__.__name__, frame, i)
 
     def update(self, ticks):
         super(Character, self).update(ticks)
@@ -384,11 +489,15 @@ class Character(Mob):
 
     def within_rect(self, rect):
         # parent method works fast but not precisely because it checks by rect and not mask of object
-        # for character accuracy is more important, so we need to redefine this method
-        x, y, w, h = self.rect.clip(rect)
-        rect_mask = Mask((w, h), True)
-        # check if total number of pixels of object mask is equal to number of pixels of object mask within rect
-        return self.mask.count() == rect_mask.overlap_area(self.mask, (self.x() - x, self.y() - y))
+        # for character accuracy is more important, so we need to redefine this method.
+        # rect that bounds pixels of mask is calculated once for every mask
+        return mask_within_rect(self, rect)
+
+    @classmethod
+    def get_source_masks(cls):
+        size = cls.image.get_height()
+        return [from_surface(cls.image.subsurface((size * i, 0, size, size)))
+                for i in range(cls.number_of_frames)]
 
     def get_sum_of_speeds(self, angle1, angle2):
         # find angle between two angles
@@ -429,21 +538,18 @@ class Character(Mob):
 
 
 class HealthLevel():
-    size = 50, 5
+    # health bar itself is drawn by hud from pre-drawn bars of every fill level
+    __slots__ = ('hp', 'color', 'max_hp')
 
     def __init__(self, current_hp, max_hp, color):
         self.hp = current_hp
         self.color = color
         self.max_hp = max_hp
-        self.update_image()
 
     def reduce_hp_level(self, hp_count):
         self.hp -= hp_count
-        self.update_image()
-
-    def update_image(self):
-        self.image = pygame.Surface(self.__class__.size)
-        self.image.fill('gray')
-        max_w, max_h = self.__class__.size
-        w = self.hp / self.max_hp * max_w
-        self.image.fill(self.color, (0, 0, w, max_h))
+
+    def get_fill(self):
+        # width of filled part of health bar in px
+        max_w = HP_BAR_SIZE[0]
+        return min(max_w, max(0, int(self.hp / self.max_hp * max_w)))